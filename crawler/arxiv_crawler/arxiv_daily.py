@@ -1,14 +1,24 @@
 # arxiv_daily.py
-# pip install arxiv
+# pip install aiohttp feedparser orjson
 
 import argparse
+import asyncio
 import datetime as dt
+import hashlib
 import json
 import os
 import tempfile
-from typing import Dict, List, Iterable, Optional
+import time
+from typing import Dict, List, Iterable, Optional, Tuple
 
-import arxiv
+import aiohttp
+import feedparser
+import orjson
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+PAGE_SIZE = 100
+CACHE_DIR = os.path.join("output", ".cache")
+_MD_ESC = str.maketrans({"|": r"\|", "[": r"\[", "]": r"\]"})
 
 
 def under_output(path: str) -> str:
@@ -20,165 +30,343 @@ def under_output(path: str) -> str:
     return base
 
 
-def atomic_dump_json(path: str, data: Dict) -> None:
-    tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+_TMP_DIRS = set()
+
+
+def _mkstemp_near(path: str) -> Tuple[int, str]:
+    """Create a temp file in a persistent .tmp dir next to `path` (same filesystem for os.replace)."""
+    tmp_dir = os.path.join(os.path.dirname(path) or ".", ".tmp")
+    if tmp_dir not in _TMP_DIRS:
+        os.makedirs(tmp_dir, exist_ok=True)
+        _TMP_DIRS.add(tmp_dir)
+    return tempfile.mkstemp(dir=tmp_dir)
+
+
+def _discard(tmp_path: str) -> None:
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+def _atomic_write(path: str, payload: bytes) -> None:
+    tmp_fd, tmp_path = _mkstemp_near(path)
     try:
-        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, path)
-    finally:
         try:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(tmp_fd, view):]
+        finally:
+            os.close(tmp_fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # 成功 replace 后临时文件已不存在，只有失败时才需要清理
+        _discard(tmp_path)
+        raise
+
 
+def atomic_dump_json(path: str, data: Dict) -> None:
+    _atomic_write(path, orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
-def atomic_write_text(path: str, text: str) -> None:
-    tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+
+def atomic_write_lines(path: str, lines: Iterable[str]) -> None:
+    """Stream an iterable of strings into `path` atomically."""
+    tmp_fd, tmp_path = _mkstemp_near(path)
     try:
         with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-            f.write(text)
+            f.writelines(lines)
         os.replace(tmp_path, path)
-    finally:
-        try:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+class RateLimiter:
+    """
+    Space out request starts across all topics so the whole run honors
+    arXiv's "one request every 3 seconds" rule. Requests that already
+    started may still be in flight concurrently.
+    """
 
+    def __init__(self, delay_seconds: float = 3.0):
+        self.delay_seconds = delay_seconds
+        self._sem = asyncio.Semaphore(1)
+        self._next_at = 0.0
 
-def get_authors(authors: Iterable[arxiv.Result.Author], first_author: bool = False) -> str:
-    names = [str(a) for a in authors]
-    return names[0] if (first_author and names) else ", ".join(names)
+    async def wait(self) -> None:
+        async with self._sem:
+            now = asyncio.get_running_loop().time()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+                now = self._next_at
+            self._next_at = now + self.delay_seconds
+
+
+def _cache_paths(params: Dict[str, str]) -> Tuple[str, str]:
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    base = os.path.join(CACHE_DIR, key)
+    return base + ".atom", base + ".meta.json"
+
+
+def _load_cached(params: Dict[str, str]) -> Tuple[Optional[bytes], Dict]:
+    atom_path, meta_path = _cache_paths(params)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = orjson.loads(f.read())
+        with open(atom_path, "rb") as f:
+            return f.read(), meta
+    except (OSError, orjson.JSONDecodeError):
+        return None, {}
+
+
+def _store_cached(params: Dict[str, str], body: Optional[bytes], meta: Dict) -> None:
+    atom_path, meta_path = _cache_paths(params)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if body is not None:
+        _atomic_write(atom_path, body)
+    # meta 最后写入：只有 .atom 完整落盘后缓存才算有效
+    atomic_dump_json(meta_path, meta)
+
+
+async def _query_arxiv(
+    session: aiohttp.ClientSession,
+    limiter: RateLimiter,
+    params: Dict[str, str],
+    num_retries: int = 3,
+    cache_ttl: float = 0,
+) -> bytes:
+    """
+    GET one page from the arXiv API, backed by an on-disk cache under
+    output/.cache. Fresh entries (younger than `cache_ttl` seconds) skip the
+    network; stale ones are revalidated with If-None-Match/If-Modified-Since.
+    """
+    cached, meta = _load_cached(params)
+    if cached is not None and time.time() - meta.get("fetched_at", 0) < cache_ttl:
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    for attempt in range(num_retries + 1):
+        await limiter.wait()
+        try:
+            async with session.get(ARXIV_API_URL, params=params, headers=headers) as resp:
+                if resp.status == 304 and cached is not None:
+                    meta["fetched_at"] = time.time()
+                    _store_cached(params, None, meta)
+                    return cached
+                resp.raise_for_status()
+                body = await resp.read()
+                _store_cached(params, body, {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                })
+                return body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == num_retries:
+                raise
+            print(f"arXiv request failed ({e!r}), retry {attempt + 1}/{num_retries}")
+    return b""
+
+
+def get_authors_pair(authors: Iterable[Dict]) -> Tuple[str, str]:
+    """Return (first author, all authors joined) from Atom author entries in one pass."""
+    names = [a.get("name", "") for a in authors]
+    return (names[0] if names else ""), ", ".join(names)
 
 
 def esc_md(s: str) -> str:
     """Escape markdown table metacharacters."""
-    return s.replace("|", r"\|").replace("[", r"\[").replace("]", r"\]")
+    return s.translate(_MD_ESC)
 
 
 def to_pdf(url: str) -> str:
     # abs -> pdf 直链
-    return url.replace("/abs/", "/pdf/") + ".pdf" if "/abs/" in url else url
+    return url.replace("/abs/", "/pdf/", 1) + ".pdf" if "/abs/" in url else url
+
 
+def paper_hash(paper: Dict) -> str:
+    """Content fingerprint used to detect changed records between runs."""
+    fields = [paper.get("title"), paper.get("updated"), paper.get("authors"), paper.get("abstract")]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode()).hexdigest()
 
-def fetch_papers(
+
+async def fetch_papers(
     topic: str,
     query: str,
     max_results: int = 10,
     since: Optional[dt.date] = None,
-    first_author_only: bool = True,
     use_pdf_link: bool = False,
-    client: Optional[arxiv.Client] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[RateLimiter] = None,
+    existing: Optional[Dict[str, Dict]] = None,
+    cache_ttl: float = 0,
 ) -> Dict[str, Dict]:
     """
     Search arXiv and return a dict keyed by base arXiv ID.
-    Filters by 'updated' date by default.
+    `since` is applied server-side on the 'updated' date, so every
+    returned entry counts toward `max_results`.
+    Entries whose 'updated' timestamp matches the record in `existing`
+    are skipped, so only new or changed papers are returned.
     """
     content: Dict[str, Dict] = {}
+    existing = existing or {}
     # 自动包装查询：若没用字段前缀，提升为 all:"..."
     if ":" not in query and '"' not in query:
         query = f'all:"{query}"'
+    # 日期过滤交给 arXiv 服务端，避免拉取后再丢弃旧论文
+    if since:
+        query = f"({query}) AND lastUpdatedDate:[{since:%Y%m%d}0000 TO 999912312359]"
 
-    search = arxiv.Search(
-        query=query,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.SubmittedDate,
-        sort_order=arxiv.SortOrder.Descending,
-    )
-    if client is None:
-        client = arxiv.Client(num_retries=3, delay_seconds=2)
+    own_session = session is None
+    if session is None:
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+    if limiter is None:
+        limiter = RateLimiter()
 
     kept = 0
-    for result in client.results(search):
-        # 以 updated 优先
-        base_dt = result.updated or result.published
-        if base_dt is None:
-            continue  # 极端兜底
-        base_date = base_dt.date()
-        if since and base_date < since:
-            continue
+    unchanged = 0
+    start = 0
+    try:
+        while start < max_results:
+            params = {
+                "search_query": query,
+                "start": str(start),
+                "max_results": str(min(PAGE_SIZE, max_results - start)),
+                "sortBy": "submittedDate",
+                "sortOrder": "descending",
+            }
+            entries = feedparser.parse(await _query_arxiv(session, limiter, params, cache_ttl=cache_ttl)).entries
+            if not entries:
+                break
+            start += len(entries)
+
+            for entry in entries:
+                # 以 updated 优先
+                parsed = entry.get("updated_parsed") or entry.get("published_parsed")
+                if parsed is None:
+                    continue  # 极端兜底
+                base_date = dt.date(*parsed[:3])
+
+                entry_id = entry.get("id", "")
+                paper_id_full = entry_id.split("arxiv.org/abs/")[-1]
+                paper_key, _, _ = paper_id_full.partition("v")
+
+                updated = entry.get("updated") or entry.get("published", "")
+                url = to_pdf(entry_id) if use_pdf_link else entry_id
+                stored = existing.get(paper_key)
+                if stored and stored.get("updated") == updated and stored.get("url") == url:
+                    unchanged += 1
+                    continue
+
+                title = esc_md(" ".join(entry.get("title", "").split()))
+
+                first_author, authors_full = get_authors_pair(entry.get("authors", []))
+                first_author, authors_full = esc_md(first_author), esc_md(authors_full)
+                primary_category = entry.get("arxiv_primary_category", {}).get("term", "")
+
+                print(f"[{topic}] kept: {kept+1}  updated={base_date}  title={title[:80]}")
+
+                paper = {
+                    "date": base_date.isoformat(),
+                    "updated": updated,
+                    "title": title,
+                    "url": url,
+                    "paper_id": paper_id_full,
+                    "authors": authors_full,
+                    "first_author": first_author,
+                    "primary_category": primary_category,
+                    "abstract": (entry.get("summary") or "").replace("\n", " ").strip(),
+                    "topic": topic,
+                }
+                paper["_hash"] = paper_hash(paper)
+                content[paper_key] = paper
+                kept += 1
+    finally:
+        if own_session:
+            await session.close()
 
-        paper_id_full = result.get_short_id()
-        vpos = paper_id_full.find("v")
-        paper_key = paper_id_full if vpos == -1 else paper_id_full[:vpos]
-
-        title = esc_md(result.title.strip())
-        url = result.entry_id
-        if use_pdf_link:
-            url = to_pdf(url)
-
-        authors_full = esc_md(get_authors(result.authors, first_author=False))
-        first_author = esc_md(get_authors(result.authors, first_author=True))
-        primary_category = getattr(result, "primary_category", None) or ""
-
-        print(f"[{topic}] kept: {kept+1}  updated={base_date}  title={title[:80]}")
-        authors_md = first_author if first_author_only else authors_full
-        md_row = f"|**{base_date}**|**{title}**|{authors_md} et al.|[{paper_id_full}]({url})|\n"
-
-        content[paper_key] = {
-            "date": base_date.isoformat(),
-            "title": title,
-            "url": url,
-            "paper_id": paper_id_full,
-            "authors": authors_full,
-            "first_author": first_author,
-            "primary_category": primary_category,
-            "abstract": (result.summary or "").replace("\n", " ").strip(),
-            "topic": topic,
-            "md_row": md_row,
-        }
-        kept += 1
+    if unchanged:
+        print(f"[{topic}] unchanged: {unchanged}")
 
     return {topic: content}
 
 
 def _load_json(path: str) -> Dict:
-    if not os.path.exists(path) or os.path.getsize(path) == 0:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    if not data:
         return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return orjson.loads(data)
 
 
 def merge_results(existing: Dict, new_batch: List[Dict[str, Dict]]) -> Dict:
     merged = dict(existing) if existing else {}
     for topic_dict in new_batch:
         for topic, papers in topic_dict.items():
-            merged.setdefault(topic, {}).update(papers)
+            stored = merged.setdefault(topic, {})
+            changed = False
+            for key, paper in papers.items():
+                old = stored.get(key)
+                if old is not None and old.get("_hash") == paper.get("_hash"):
+                    continue
+                stored[key] = paper
+                changed = True
+            if changed:
+                # 保持每个主题按日期降序存储，渲染时即可省去排序
+                merged[topic] = dict(sorted(stored.items(), key=lambda kv: kv[1].get("date", ""), reverse=True))
     return merged
 
 
-def json_to_md(
-    json_path: str,
-    md_path: str = "output/output.md",
-    title_prefix: str = "Updated on",
-    sort_desc_by_date: bool = True,
-) -> None:
-    data = _load_json(json_path)
+def _md_lines(
+    data: Dict,
+    title_prefix: str,
+    sort_desc_by_date: bool,
+    first_author_only: bool,
+) -> Iterable[str]:
     today = dt.date.today().strftime("%Y.%m.%d")
+    yield f"## {title_prefix} {today}\n"
 
-    lines: List[str] = [f"## {title_prefix} {today}\n"]
+    author_field = "first_author" if first_author_only else "authors"
     for topic in sorted(data.keys()):
         items = data[topic]
         if not items:
             continue
         rows = list(items.values())
-        rows.sort(key=lambda r: r.get("date", ""), reverse=sort_desc_by_date)
-        if not rows:
-            continue
-        lines.append(f"## {topic}\n")
-        lines.append("|Updated Date|Title|Authors|PDF|\n|---|---|---|---|\n")
+        # 本流程写出的 JSON 已按日期降序；只有外部来源的乱序数据才需要重新排序
+        if any(a.get("date", "") < b.get("date", "") for a, b in zip(rows, rows[1:])):
+            rows.sort(key=lambda r: r.get("date", ""), reverse=True)
+        if not sort_desc_by_date:
+            rows.reverse()
+        yield f"## {topic}\n"
+        yield "|Updated Date|Title|Authors|PDF|\n|---|---|---|---|\n"
         for r in rows:
-            lines.append(r["md_row"])
-        lines.append("\n")
+            yield f"|**{r['date']}**|**{r['title']}**|{r[author_field]} et al.|[{r['paper_id']}]({r['url']})|\n"
+        yield "\n"
+
 
-    atomic_write_text(md_path, "".join(lines))
+def json_to_md(
+    json_path: str,
+    md_path: str = "output/output.md",
+    title_prefix: str = "Updated on",
+    sort_desc_by_date: bool = True,
+    first_author_only: bool = True,
+) -> None:
+    data = _load_json(json_path)
+    atomic_write_lines(md_path, _md_lines(data, title_prefix, sort_desc_by_date, first_author_only))
     print(f"Markdown written -> {md_path}")
     print("finished")
 
 
-def run(
+async def run(
     keywords: Dict[str, str],
     json_out: str = "output/papers.json",
     md_out: str = "output/output.md",
@@ -186,27 +374,30 @@ def run(
     since: Optional[dt.date] = None,
     first_author_only: bool = True,
     use_pdf_link: bool = False,
+    cache_ttl: float = 3600,
 ) -> None:
-    client = arxiv.Client(num_retries=3, delay_seconds=2)
-
-    data_collector: List[Dict[str, Dict]] = []
-    for topic in sorted(keywords.keys()):
-        query = keywords[topic]
-        data = fetch_papers(
-            topic=topic,
-            query=query,
-            max_results=max_results,
-            since=since,
-            first_author_only=first_author_only,
-            use_pdf_link=use_pdf_link,
-            client=client,
-        )
-        data_collector.append(data)
-
     existing = _load_json(json_out)
+    # 所有主题并发抓取，共享同一个 session 与全局限速器
+    limiter = RateLimiter(delay_seconds=3)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        data_collector: List[Dict[str, Dict]] = await asyncio.gather(*(
+            fetch_papers(
+                topic=topic,
+                query=keywords[topic],
+                max_results=max_results,
+                since=since,
+                use_pdf_link=use_pdf_link,
+                session=session,
+                limiter=limiter,
+                existing=existing.get(topic),
+                cache_ttl=cache_ttl,
+            )
+            for topic in sorted(keywords.keys())
+        ))
+
     merged = merge_results(existing, data_collector)
     atomic_dump_json(json_out, merged)
-    json_to_md(json_out, md_out)
+    json_to_md(json_out, md_out, first_author_only=first_author_only)
 
 
 def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
@@ -223,6 +414,9 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
                    help="Show full author list instead of first author.")
     p.add_argument("--pdf-link", action="store_true",
                    help="Link to direct PDF instead of abstract page.")
+    p.add_argument("--cache-ttl", type=float, default=3600,
+                   help="Reuse cached arXiv responses younger than this many seconds "
+                        "without revalidating (0 = always revalidate).")
     return p.parse_args(argv)
 
 
@@ -241,7 +435,7 @@ def main(argv: Optional[List[str]] = None) -> None:
     if args.reset or (not os.path.exists(json_out)):
         atomic_dump_json(json_out, {})
 
-    run(
+    asyncio.run(run(
         keywords=keywords,
         json_out=json_out,
         md_out=md_out,
@@ -249,7 +443,8 @@ def main(argv: Optional[List[str]] = None) -> None:
         since=since_date,
         first_author_only=not args.all_authors,
         use_pdf_link=args.pdf_link,
-    )
+        cache_ttl=args.cache_ttl,
+    ))
 
 
 if __name__ == "__main__":
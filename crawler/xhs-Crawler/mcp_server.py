@@ -1,4 +1,5 @@
 import asyncio
+import logging
 import os
 import sys
 # 这里导入 mcp，使用的是 "mcp-workspace" 环境里的库
@@ -9,48 +10,89 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 # 爬虫脚本名称
 CRAWLER_SCRIPT_NAME = "run_crawler_cli.py"
 
+
+def _route_logs_to_stderr() -> None:
+    # stdout 留给 MCP stdio 协议：把爬虫日志的控制台输出统一指向 stderr
+    for lg in (logging.getLogger(), logging.getLogger("MediaCrawler")):
+        for handler in lg.handlers:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+
+
+# 若爬虫依赖已安装在当前环境，则直接在进程内调用，省去每次拉起解释器的开销；
+# 否则回退到 uv 子进程（双环境模式）
+try:
+    from run_crawler_cli import main as run_xhs
+except ImportError:
+    run_xhs = None
+else:
+    _route_logs_to_stderr()
+
+# 爬虫通过修改全局 config 工作，同一时刻只允许一个任务
+_CRAWL_SEM = asyncio.Semaphore(1)
+
 mcp = FastMCP("XHS Media Crawler")
 
 
+async def _crawl_in_process(keyword: str) -> str:
+    # 爬虫以当前工作目录存放数据与浏览器登录态，与子进程模式一样固定在 PROJECT_ROOT
+    os.chdir(PROJECT_ROOT)
+    content_file, comment_file = await run_xhs(keyword)
+    return f"✅ Crawling finished!\nContents: {content_file}\nComments: {comment_file}\n"
+
+
+async def _crawl_via_subprocess(keyword: str) -> str:
+    # 指令：uv run run_crawler_cli.py ...
+    # 注意：这里调用的 'uv' 会自动查找当前目录（PROJECT_ROOT）下的 pyproject.toml
+    # 从而激活 MediaCrawler 自己的独立环境（士兵环境）
+    cmd = ["uv", "run", CRAWLER_SCRIPT_NAME, "--keyword", keyword]
+
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=PROJECT_ROOT,  # <--- 关键！强制在 MediaCrawler 目录下执行，确保用到爬虫的依赖
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    stdout, stderr = await process.communicate()
+    output = stdout.decode().strip()
+    error_output = stderr.decode().strip()
+
+    if process.returncode != 0:
+        return f"❌ Crawler process failed.\nError output:\n{error_output}\n\nStandard output:\n{output}"
+
+    if "__RESULT_PATH_START__" in output:
+        try:
+            result_part = output.split("__RESULT_PATH_START__")[1].split("__RESULT_PATH_END__")[0]
+            return f"✅ Crawling finished!\n{result_part}"
+        except IndexError:
+            return f"⚠️ Output format parsing failed. Raw output:\n{output}"
+    else:
+        return f"⚠️ Crawling finished but path marker not found.\nLast output:\n{output[-500:]}"
+
+
+async def _crawl_exclusive(keyword: str) -> str:
+    async with _CRAWL_SEM:
+        if run_xhs:
+            return await _crawl_in_process(keyword)
+        return await _crawl_via_subprocess(keyword)
+
+
 @mcp.tool()
 async def crawl_xhs_images(keyword: str) -> str:
     """
     Search for XiaoHongShu (RedNote) image notes by keyword.
     """
-    print(f"--- [MCP] Delegating task via uv: Crawl keyword '{keyword}' ---")
+    mode = "in-process" if run_xhs else "uv"
+    print(f"--- [MCP] Delegating task via {mode}: Crawl keyword '{keyword}' ---", file=sys.stderr)
 
     try:
-        # 指令：uv run run_crawler_cli.py ...
-        # 注意：这里调用的 'uv' 会自动查找当前目录（PROJECT_ROOT）下的 pyproject.toml
-        # 从而激活 MediaCrawler 自己的独立环境（士兵环境）
-        cmd = ["uv", "run", CRAWLER_SCRIPT_NAME, "--keyword", keyword]
-        
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=PROJECT_ROOT,  # <--- 关键！强制在 MediaCrawler 目录下执行，确保用到爬虫的依赖
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-        output = stdout.decode().strip()
-        error_output = stderr.decode().strip()
-
-        if process.returncode != 0:
-            return f"❌ Crawler process failed.\nError output:\n{error_output}\n\nStandard output:\n{output}"
-
-        if "__RESULT_PATH_START__" in output:
-            try:
-                result_part = output.split("__RESULT_PATH_START__")[1].split("__RESULT_PATH_END__")[0]
-                return f"✅ Crawling finished!\n{result_part}"
-            except IndexError:
-                return f"⚠️ Output format parsing failed. Raw output:\n{output}"
-        else:
-            return f"⚠️ Crawling finished but path marker not found.\nLast output:\n{output[-500:]}"
+        # 客户端取消调用时不打断正在进行的爬取
+        return await asyncio.shield(_crawl_exclusive(keyword))
 
     except Exception as e:
         return f"❌ MCP Server Error: {str(e)}"
 
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    mcp.run()
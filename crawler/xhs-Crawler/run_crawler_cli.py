@@ -1,5 +1,4 @@
 import asyncio
-import sys
 import argparse
 import os
 
@@ -10,6 +9,7 @@ from var import crawler_type_var
 from tools import utils
 
 async def main(keyword):
+    """运行一次搜索爬取，返回 (笔记内容文件, 评论文件) 路径。"""
     # ==============================
     # 1. 动态配置参数
     # ==============================
@@ -39,7 +39,7 @@ async def main(keyword):
     await crawler.start()
     
     # ==============================
-    # 3. 输出结果路径 (这是给 MCP 看的关键信息)
+    # 3. 返回结果路径 (这是给 MCP 看的关键信息)
     # ==============================
     date_str = utils.get_current_date()
     cwd = os.getcwd()
@@ -48,12 +48,7 @@ async def main(keyword):
     # 构造文件名
     content_file = os.path.join(json_dir, f"search_contents_{date_str}.json")
     comment_file = os.path.join(json_dir, f"search_comments_{date_str}.json")
-    
-    # 用特殊标记打印结果，方便 MCP 提取
-    print(f"__RESULT_PATH_START__")
-    print(f"Contents: {content_file}")
-    print(f"Comments: {comment_file}")
-    print(f"__RESULT_PATH_END__")
+    return content_file, comment_file
 
 if __name__ == "__main__":
     # 解析命令行参数
@@ -62,6 +57,10 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # 运行
-    if sys.platform.startswith('win'):
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(main(args.keyword))
\ No newline at end of file
+    content_file, comment_file = asyncio.run(main(args.keyword))
+
+    # 用特殊标记打印结果，方便以子进程方式调用时提取
+    print(f"__RESULT_PATH_START__")
+    print(f"Contents: {content_file}")
+    print(f"Comments: {comment_file}")
+    print(f"__RESULT_PATH_END__")
\ No newline at end of file
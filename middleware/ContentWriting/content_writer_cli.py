@@ -4,15 +4,15 @@ import argparse
 import sys
 import logging
 import httpx
-import asyncio
+import orjson
 from datetime import datetime
+import openai
 from openai import OpenAI
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 # ================= 配置区 =================
-# 请确保在环境变量中设置了 QWEN_API_KEY
+# 请确保在环境变量中设置了 QWEN_API_KEY（在首次创建客户端时检查，而不是导入时）
 QWEN_API_KEY = os.getenv("QWEN_API_KEY")
-if not QWEN_API_KEY:
-    raise ValueError("Environment variable 'QWEN_API_KEY' is not set.")
 MODEL_NAME = "qwen-plus"
 
 logging.basicConfig(
@@ -20,7 +20,7 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("writer_service.log", mode='a', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
+        logging.StreamHandler(sys.stderr)
     ]
 )
 logger = logging.getLogger(__name__)
@@ -34,6 +34,41 @@ elif month in [9, 10, 11]: CURRENT_SEASON = "秋季"
 else: CURRENT_SEASON = "冬季"
 CURRENT_DATE_STR = f"{CURRENT_DATE.strftime('%Y年%m月%d日')} ({CURRENT_SEASON})"
 
+# 模块级共享客户端：首次使用时创建，之后复用同一个 SSL 上下文与连接池
+_CLIENT = None
+
+def get_client():
+    global _CLIENT
+    if _CLIENT is None:
+        if not QWEN_API_KEY:
+            raise ValueError("Environment variable 'QWEN_API_KEY' is not set.")
+        _CLIENT = OpenAI(
+            api_key=QWEN_API_KEY,
+            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+            http_client=httpx.Client(
+                trust_env=False, timeout=120.0,
+                limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60)
+            )
+        )
+    return _CLIENT
+
+# 限流 / 连接异常 / 5xx 属于瞬时错误，指数退避(带抖动)后重试
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+@retry(
+    wait=wait_random_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    reraise=True,
+)
+def _call_llm(client, messages):
+    return client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=0.7,
+        response_format={"type": "json_object"} # 强制 JSON 输出
+    )
+
 def load_json(path):
     try:
         with open(path, 'r', encoding='utf-8') as f:
@@ -53,16 +88,17 @@ def generate_final_post(client, audited_data, keyword):
         return None
     
     # 数据瘦身，防止 Token 溢出
-    minified_data = []
-    for item in audited_data:
-        if "error" in item: continue
-        minified_data.append({
+    minified_data = [
+        {
             "title": item.get("original_title", "无标题"),
             "audit_details": item.get("audit_details", []),
             "scores": item.get("scores", {})
-        })
+        }
+        for item in audited_data if "error" not in item
+    ]
 
-    data_context = json.dumps(minified_data, ensure_ascii=False, indent=2)
+    # 紧凑 JSON（无缩进）即可被模型读取，同时减少 Prompt Token
+    data_context = orjson.dumps(minified_data).decode()
 
     # =================================================================
     # 核心 Prompt 构建
@@ -128,15 +164,10 @@ def generate_final_post(client, audited_data, keyword):
     """
 
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"} # 强制 JSON 输出
-        )
+        response = _call_llm(client, [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ])
         
         result = response.choices[0].message.content
         return json.loads(result)
@@ -146,21 +177,19 @@ def generate_final_post(client, audited_data, keyword):
         return None
 
 def main(file_path, keyword):
-    print(f"🚀 [启动] 文案生成流程 | 关键词: {keyword}")
+    """生成文案并落盘，成功时返回结果文件路径，失败返回 None。"""
+    # 日志只走 logger（stderr + 文件）：在 MCP 服务进程内调用时 stdout 属于 stdio 协议
+    logger.info(f"🚀 [启动] 文案生成流程 | 关键词: {keyword}")
     
-    if "sk-" not in QWEN_API_KEY:
-        print("❌ 错误: API Key 未配置！")
-        return
-
-    client = OpenAI(
-        api_key=QWEN_API_KEY,
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-        http_client=httpx.Client(trust_env=False, timeout=120.0)
-    )
+    if not QWEN_API_KEY or "sk-" not in QWEN_API_KEY:
+        logger.error("❌ 错误: API Key 未配置！")
+        return None
+
+    client = get_client()
 
     if not os.path.exists(file_path):
-        print(f"❌ 错误: 文件不存在 -> {file_path}")
-        return
+        logger.error(f"❌ 错误: 文件不存在 -> {file_path}")
+        return None
 
     audited_data = load_json(file_path)
     
@@ -176,19 +205,13 @@ def main(file_path, keyword):
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(final_json, f, ensure_ascii=False, indent=2)
         
-        print(f"\n✅ [成功] 文案已生成并保存！")
-        print(f"📂 文件路径: {output_path}")
-        
-        print("-" * 30)
-        print(f"Title: {final_json.get('title')}")
-        print("-" * 30)
+        logger.info("✅ [成功] 文案已生成并保存！")
+        logger.info(f"📂 文件路径: {output_path}")
+        logger.info(f"Title: {final_json.get('title')}")
+        return output_path
 
-        # 这里的标记是为了方便其他工具抓取路径
-        print("__JSON_START__")
-        print(output_path)
-        print("__JSON_END__")
-    else:
-        print("❌ [失败] 未能生成文案。")
+    logger.error("❌ [失败] 未能生成文案。")
+    return None
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -196,7 +219,9 @@ if __name__ == "__main__":
     parser.add_argument("--keyword", type=str, default="通用", help="Search keyword")
     args = parser.parse_args()
     
-    if sys.platform.startswith('win'):
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        
-    main(args.file, args.keyword)
\ No newline at end of file
+    output_path = main(args.file, args.keyword)
+    if output_path:
+        # 这里的标记是为了方便其他工具抓取路径
+        print("__JSON_START__")
+        print(output_path)
+        print("__JSON_END__")
\ No newline at end of file
@@ -1,17 +1,30 @@
 import asyncio
+import json
 import os
 import sys
 from mcp.server.fastmcp import FastMCP
 
 # ================= 配置区 =================
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-WRITER_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "content_writer_cli.py")
-# 使用统一环境 Python
-PYTHON_EXECUTABLE = sys.executable
+# 同进程直接导入文案生成入口，省去每次调用拉起子进程的开销
+sys.path.insert(0, PROJECT_ROOT)
+from content_writer_cli import main as run_writer  # noqa: E402
+
+# 同时进行的生成任务数上限
+MAX_CONCURRENT_RUNS = 2
 # =========================================
 
+_WRITER_SEM = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+
 mcp = FastMCP("XHS Content Writer")
 
+
+async def _write_exclusive(audited_file_path: str, keyword: str):
+    async with _WRITER_SEM:
+        # 生成流程只通过 logger 输出到 stderr/日志文件，不会写 stdout（stdio 协议通道）
+        return await asyncio.to_thread(run_writer, audited_file_path, keyword)
+
+
 @mcp.tool()
 async def generate_travel_guide(audited_file_path: str, keyword: str = "旅游攻略") -> str:
     """
@@ -22,48 +35,27 @@ async def generate_travel_guide(audited_file_path: str, keyword: str = "旅游
         keyword: The main topic or keyword (e.g., '苏州旅游', '美食探店'). 
                  The model can generate this based on user intent.
     """
-    print(f"--- [MCP-Writer] Generating content for '{keyword}' from '{audited_file_path}' ---")
+    print(f"--- [MCP-Writer] Generating content for '{keyword}' from '{audited_file_path}' ---", file=sys.stderr)
 
     try:
         if not os.path.exists(audited_file_path):
             return f"❌ Error: File not found at {audited_file_path}"
 
-        cmd = [PYTHON_EXECUTABLE, WRITER_SCRIPT_PATH, "--file", audited_file_path, "--keyword", keyword]
-        
-        print(f"[Debug] Executing: {' '.join(cmd)}")
-
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=PROJECT_ROOT,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        # 客户端取消调用时不打断正在进行的生成
+        saved_path = await asyncio.shield(_write_exclusive(audited_file_path, keyword))
 
-        stdout, stderr = await process.communicate()
-        output = stdout.decode().strip()
-        error_output = stderr.decode().strip()
+        if not saved_path:
+            return "❌ Generation failed. See writer_service.log for details."
 
-        if process.returncode != 0:
-            return f"❌ Generation failed.\nError:\n{error_output}\nOutput:\n{output}"
+        with open(saved_path, 'r', encoding='utf-8') as f:
+            post = json.load(f)
+        topics = " ".join(f"#{t}" for t in post.get("topics", []))
+        content = f"{post.get('title', '')}\n\n{post.get('content', '')}\n\n{topics}".strip()
 
-        # 提取生成的文案
-        if "__CONTENT_START__" in output:
-            try:
-                content = output.split("__CONTENT_START__")[1].split("__CONTENT_END__")[0].strip()
-                # 尝试提取文件路径（可选）
-                file_path_info = ""
-                if "__FILE_PATH__: " in output:
-                    saved_path = output.split("__FILE_PATH__: ")[1].strip()
-                    file_path_info = f"\n\n(已自动保存至本地: {saved_path})"
-                
-                return f"✅ 文案生成成功！\n\n{content}{file_path_info}"
-            except IndexError:
-                return f"⚠️ Output parsing error. Raw:\n{output}"
-        else:
-            return f"⚠️ Script finished but no content returned.\nLast output:\n{output[-500:]}"
+        return f"✅ 文案生成成功！\n\n{content}\n\n(已自动保存至本地: {saved_path})"
 
     except Exception as e:
         return f"❌ MCP Server Error: {str(e)}"
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    mcp.run()
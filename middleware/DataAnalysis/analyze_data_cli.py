@@ -6,24 +6,34 @@ import sys
 import logging
 import traceback
 import httpx
+import orjson
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Dict, Any
-from openai import OpenAI
-from tqdm import tqdm
+from typing import List, Dict, Any, Tuple
+import openai
+from openai import AsyncOpenAI
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from tqdm.asyncio import tqdm
 
 # ================= 配置区 =================
-# 请确保在环境变量中设置了 QWEN_API_KEY
+# 请确保在环境变量中设置了 QWEN_API_KEY（在首次创建客户端时检查，而不是导入时）
 QWEN_API_KEY = os.getenv("QWEN_API_KEY")
-if not QWEN_API_KEY:
-    raise ValueError("Environment variable 'QWEN_API_KEY' is not set.")
 MODEL_NAME = "qwen-plus"
+# 同时在途的审计请求数
+MAX_CONCURRENT_AUDITS = 8
+# 笔记数超过该阈值时改走 Batch API（吞吐更高、单价更低，但需排队等待）
+BATCH_THRESHOLD = 32
+# Batch 任务状态轮询间隔（秒）
+BATCH_POLL_INTERVAL = 30
+# Batch 任务最长等待时间（秒），超时后取消任务并回退到并发直连模式；可用环境变量 BATCH_MAX_WAIT 调整
+BATCH_MAX_WAIT = int(os.getenv("BATCH_MAX_WAIT", "1800"))
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("analysis_service.log", mode='a', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
+        logging.StreamHandler(sys.stderr)
     ]
 )
 logger = logging.getLogger(__name__)
@@ -74,11 +84,43 @@ SYSTEM_PROMPT = f"""
     }}
 }}
 """
+
+# User Prompt 中与笔记无关的部分只在导入时构建一次
+_USER_PROMPT_CONTEXT = f"""
+    【当前基准时间】
+    今天是: {CURRENT_DATE_STR}
+    
+    【用户评论证据库】
+    """
+
+_USER_PROMPT_TAIL = """
+    
+    请严格执行审计。
+    **特别注意**：如果评论提到“倒闭了”、“拆了”、“没了”，请务必将 `availability_score` 设为 0。
+    """
 # ==============================================================================
 
+# 模块级共享客户端：首次使用时创建，连接池与 TLS 会话在多次审计间复用
+_CLIENT = None
+
+def get_client():
+    global _CLIENT
+    if _CLIENT is None:
+        if not QWEN_API_KEY:
+            raise ValueError("Environment variable 'QWEN_API_KEY' is not set.")
+        _CLIENT = AsyncOpenAI(
+            api_key=QWEN_API_KEY,
+            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+            http_client=httpx.AsyncClient(
+                trust_env=False, timeout=120.0,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=60)
+            )
+        )
+    return _CLIENT
+
 def load_json(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
 
 def find_comments_file(content_path):
     dir_name = os.path.dirname(content_path)
@@ -91,44 +133,54 @@ def find_comments_file(content_path):
         return comments_path
     return None
 
-def test_connection_at_startup(client):
+# 限流 / 连接异常 / 5xx 属于瞬时错误，指数退避(带抖动)后重试
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+@retry(
+    wait=wait_random_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    reraise=True,
+)
+async def _call_llm(client: AsyncOpenAI, messages: List[Dict]):
+    return await client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=0.1,
+        response_format={"type": "json_object"}
+    )
+
+async def test_connection_at_startup(client):
     try:
-        client.chat.completions.create(
+        await client.chat.completions.create(
             model=MODEL_NAME, messages=[{"role": "user", "content": "Hi"}], max_tokens=1
         )
         return True
     except Exception:
         return False
 
-async def process_single_note(client: OpenAI, note: Dict, comments: List[Dict]):
-    note_id = note.get('note_id')
-    logger.info(f"正在审计笔记: {note_id}")
-    
-    # --- 修改开始：构建评论层级结构 ---
-    root_comments = []      # 一级评论列表
-    replies_map = {}        # 二级评论字典：{parent_id: [reply1, reply2...]}
-    
-    # 1. 第一遍遍历：根据 parent_comment_id 分组
+def _partition(comments: List[Dict]) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """把一条笔记的评论拆成 (一级评论列表, {parent_id: [回复...]})。"""
+    root_comments = []                                      # 一级评论列表
+    replies_map: Dict[str, List[Dict]] = defaultdict(list)  # 二级评论字典：{parent_id: [reply1, reply2...]}
+
     for c in comments:
-        content = c.get("content", "").strip()
         # 简单过滤过短内容，防止无效字符干扰，但保留层级结构
-        if len(content) < 1: continue 
-        
-        c_id = c.get("comment_id")
-        p_id = c.get("parent_comment_id")
-        
-        # 兼容 parent_comment_id 可能是字符串 "0" 或数字 0 的情况
-        if str(p_id) == "0":
+        if not c.get("content", "").strip(): continue
+
+        # 兼容 parent_comment_id 可能是字符串 "0" 或数字 0 的情况，统一转 str 作为 Key
+        p_id = str(c.get("parent_comment_id"))
+        if p_id == "0":
             root_comments.append(c)
         else:
-            # 记录回复，Key 为父评论 ID
-            # 注意：这里确保 p_id 是字符串以便后续查找匹配（视具体json数据类型而定，通常建议统一转str）
-            p_id_str = str(p_id)
-            if p_id_str not in replies_map:
-                replies_map[p_id_str] = []
-            replies_map[p_id_str].append(c)
+            replies_map[p_id].append(c)
+    return root_comments, replies_map
+
+def _build_messages(note: Dict, grouped_comments: Tuple[List[Dict], Dict[str, List[Dict]]]) -> List[Dict]:
+    # --- 评论层级已在 main 中按 note_id 预先分组 ---
+    root_comments, replies_map = grouped_comments
             
-    # 2. 第二遍遍历：构建用于 Prompt 的文本字符串
+    # 构建用于 Prompt 的文本字符串
     formatted_lines = []
     
     # 限制处理的主评论数量，防止 Token 溢出 (例如只取前30条热门主评)
@@ -154,93 +206,190 @@ async def process_single_note(client: OpenAI, note: Dict, comments: List[Dict]):
     标题: {note.get('title', '无标题')}
     发布时间戳: {note.get('time', '未知')}
     内容: {note.get('desc', '无内容')}
+    {_USER_PROMPT_CONTEXT}{comments_str}{_USER_PROMPT_TAIL}"""
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _finalize(note: Dict, content: str) -> Dict:
+    note_id = note.get('note_id')
+    result_json = json.loads(content)
     
-    【当前基准时间】
-    今天是: {CURRENT_DATE_STR}
-    
-    【用户评论证据库】
-    {comments_str}
+    result_json["note_id"] = note_id
+    result_json["original_title"] = note.get("title")
+    result_json["original_link"] = f"https://www.xiaohongshu.com/explore/{note_id}"
     
-    请严格执行审计。
-    **特别注意**：如果评论提到“倒闭了”、“拆了”、“没了”，请务必将 `availability_score` 设为 0。
-    """
+    return result_json
+
+async def process_single_note(client: AsyncOpenAI, note: Dict, grouped_comments: Tuple[List[Dict], Dict[str, List[Dict]]]):
+    note_id = note.get('note_id')
+    logger.info(f"正在审计笔记: {note_id}")
 
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"}
-        )
-        result_json = json.loads(response.choices[0].message.content)
-        
-        result_json["note_id"] = note_id
-        result_json["original_title"] = note.get("title")
-        result_json["original_link"] = f"https://www.xiaohongshu.com/explore/{note_id}"
-        
-        return result_json
+        response = await _call_llm(client, _build_messages(note, grouped_comments))
+        return _finalize(note, response.choices[0].message.content)
 
     except Exception as e:
         logger.error(f"❌ 笔记 {note_id} 失败: {e}")
         return {"note_id": note_id, "error": str(e)}
 
+async def audit_interactive(client: AsyncOpenAI, notes: List[Dict], grouped: Dict, jsonl_path: str) -> List[Dict]:
+    """并发逐条审计，结果按输入笔记顺序返回。"""
+    no_comments = ([], {})
+    sem = asyncio.Semaphore(MAX_CONCURRENT_AUDITS)
+
+    async def _bounded(idx, note):
+        async with sem:
+            nid = note.get("note_id")
+            return idx, await process_single_note(client, note, grouped.get(nid, no_comments))
+
+    # 逐条追加的中间结果：上次运行中途崩溃时，已成功的审计直接复用，不再重复请求
+    done: Dict[int, Dict] = {}
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, 'rb') as jsonl:
+            for line in jsonl:
+                try:
+                    rec = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # 崩溃时写了一半的行
+                idx, res = rec.get("idx"), rec.get("result")
+                # 下标与 note_id 都对得上才复用，失败的结果重新审计
+                if (isinstance(idx, int) and 0 <= idx < len(notes) and isinstance(res, dict)
+                        and "error" not in res and rec.get("note_id") == notes[idx].get("note_id")):
+                    done[idx] = res
+        if done:
+            logger.info(f"♻️ 复用上次已完成的 {len(done)} 条审计结果")
+
+    results: List[Any] = [None] * len(notes)
+    for idx, res in done.items():
+        results[idx] = res
+    tasks = [_bounded(i, note) for i, note in enumerate(notes) if i not in done]
+    with open(jsonl_path, 'ab') as jsonl:
+        # 上次写了一半的行单独隔开，避免与新记录粘连
+        if jsonl.tell() > 0:
+            jsonl.write(b"\n")
+        for fut in tqdm.as_completed(tasks, total=len(tasks), desc="Auditing"):
+            idx, res = await fut
+            results[idx] = res
+            jsonl.write(orjson.dumps({"idx": idx, "note_id": notes[idx].get("note_id"), "result": res}) + b"\n")
+            jsonl.flush()
+
+    # 全部完成后中间文件不再需要
+    os.remove(jsonl_path)
+    return results
+
+async def audit_via_batch(client: AsyncOpenAI, notes: List[Dict], grouped: Dict) -> List[Dict]:
+    """通过 Batch API 一次性提交全部审计请求，轮询完成后按输入顺序重组结果。"""
+    no_comments = ([], {})
+    # custom_id 用输入下标：note_id 可能缺失或重复，下标可唯一映射回笔记
+    lines = []
+    for idx, note in enumerate(notes):
+        body = {
+            "model": MODEL_NAME,
+            "messages": _build_messages(note, grouped.get(note.get("note_id"), no_comments)),
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"},
+        }
+        lines.append(orjson.dumps({"custom_id": str(idx), "method": "POST", "url": "/v1/chat/completions", "body": body}))
+
+    input_file = await client.files.create(file=("audit_batch.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info(f"📦 已提交 Batch 任务 {batch.id} ({len(notes)} 条笔记)")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_MAX_WAIT
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        if loop.time() >= deadline:
+            try:
+                await client.batches.cancel(batch.id)
+            except Exception as e:
+                logger.warning(f"取消 Batch {batch.id} 失败: {e}")
+            raise TimeoutError(f"Batch {batch.id} 超过 {BATCH_MAX_WAIT}s 未完成，已取消")
+        await asyncio.sleep(min(BATCH_POLL_INTERVAL, max(deadline - loop.time(), 0)))
+        batch = await client.batches.retrieve(batch.id)
+        logger.info(f"Batch {batch.id} 状态: {batch.status}")
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} 结束状态为 {batch.status}")
+
+    results: List[Any] = [None] * len(notes)
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id: continue
+        content = await client.files.content(file_id)
+        for line in content.content.splitlines():
+            if not line.strip(): continue
+            rec = orjson.loads(line)
+            idx = int(rec["custom_id"])
+            note = notes[idx]
+            response = rec.get("response") or {}
+            try:
+                if response.get("status_code") != 200:
+                    raise RuntimeError(rec.get("error") or response.get("body"))
+                results[idx] = _finalize(note, response["body"]["choices"][0]["message"]["content"])
+            except Exception as e:
+                logger.error(f"❌ 笔记 {note.get('note_id')} 失败: {e}")
+                results[idx] = {"note_id": note.get("note_id"), "error": str(e)}
+
+    for idx, res in enumerate(results):
+        if res is None:
+            results[idx] = {"note_id": notes[idx].get("note_id"), "error": "batch 输出中缺少该笔记结果"}
+    return results
+
 async def main(content_path):
+    """执行审计流程，成功时返回结果文件路径，失败返回 None。"""
     logger.info(f"🚀 启动深度审计任务 (当前季节: {CURRENT_SEASON})...")
     
-    try:
-        client = OpenAI(
-            api_key=QWEN_API_KEY,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            http_client=httpx.Client(trust_env=False, timeout=120.0)
-        )
-    except Exception as e:
-        logger.critical(f"Client Init Failed: {e}")
-        return
+    client = get_client()
+    if not await test_connection_at_startup(client): return None
 
-    if not test_connection_at_startup(client): return
-
-    if not os.path.exists(content_path):
+    try:
+        notes = load_json(content_path)
+    except FileNotFoundError:
         logger.error("文件不存在")
-        return
-        
-    notes = load_json(content_path)
+        return None
     if isinstance(notes, dict): notes = [notes]
     
-    comments_map = {}
+    comments_map = defaultdict(list)
     comments_path = find_comments_file(content_path)
     if comments_path:
         raw_comments = load_json(comments_path)
         for c in raw_comments:
-            nid = c.get("note_id")
-            if nid not in comments_map: comments_map[nid] = []
-            comments_map[nid].append(c)
+            comments_map[c.get("note_id")].append(c)
+    # 一次性完成所有笔记的评论层级划分
+    grouped = {nid: _partition(cs) for nid, cs in comments_map.items()}
     
-    results = []
-    for note in tqdm(notes, desc="Auditing"): 
-        nid = note.get("note_id")
-        # 这里的 comments_map.get(nid, []) 已经传递了该 note 下的所有评论
-        res = await process_single_note(client, note, comments_map.get(nid, []))
-        results.append(res)
-
     output_dir = os.path.dirname(content_path)
     output_filename = "audited_" + os.path.basename(content_path)
     output_path = os.path.join(output_dir, output_filename)
+    jsonl_path = os.path.splitext(output_path)[0] + ".jsonl"
+
+    results = None
+    # 大批量审计走 Batch API；小批量仍并发直连，保证交互延迟
+    if len(notes) > BATCH_THRESHOLD:
+        try:
+            results = await audit_via_batch(client, notes, grouped)
+        except Exception as e:
+            logger.warning(f"Batch 审计失败，回退到并发模式: {e}")
+    if results is None:
+        results = await audit_interactive(client, notes, grouped, jsonl_path)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=4)
+    with open(output_path, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
-    print(f"__ANALYSIS_RESULT_START__")
-    print(output_path)
-    print(f"__ANALYSIS_RESULT_END__")
     logger.info(f"结果已保存: {output_path}")
+    return output_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--file", type=str, required=True)
     args = parser.parse_args()
-    if sys.platform.startswith('win'):
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(main(args.file))
\ No newline at end of file
+    output_path = asyncio.run(main(args.file))
+    if output_path:
+        print(f"__ANALYSIS_RESULT_START__")
+        print(output_path)
+        print(f"__ANALYSIS_RESULT_END__")
\ No newline at end of file
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dashscope import Generation
+
+# 按 (model, system, user) 内容寻址的 LLM 结果磁盘缓存
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xhs_agent", "llm")
+DEFAULT_TTL = 86400 * 7
+
+logger = logging.getLogger(__name__)
+
+# 命中/未命中计数，便于观察缓存效果
+STATS = {"hit": 0, "miss": 0}
+
+def _cache_path(model, system, user):
+    key = hashlib.sha256(json.dumps([model, system, user], sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def _load(path, ttl):
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _store(path, content):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"content": content}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp): os.remove(tmp)
+
+def evict(model, system, user):
+    """删除一条缓存（例如回复内容无法解析时），下次调用重新请求。"""
+    try:
+        os.remove(_cache_path(model, system, user))
+    except OSError:
+        pass
+
+def cached_call(model, system, user, ttl=DEFAULT_TTL):
+    """调用 Generation.call 并返回回复文本；同样的输入在 ttl 秒内直接读缓存。失败时抛 RuntimeError。"""
+    path = _cache_path(model, system, user)
+    content = _load(path, ttl)
+    if content is not None:
+        STATS["hit"] += 1
+        logger.info(f"LLM cache hit ({STATS['hit']} hit / {STATS['miss']} miss)")
+        return content
+
+    STATS["miss"] += 1
+    response = Generation.call(
+        model=model,
+        messages=[
+            {'role': 'system', 'content': system},
+            {'role': 'user', 'content': user}
+        ],
+        result_format='message'
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"LLM call failed. Code: {response.code}, Message: {response.message}")
+
+    content = response.output.choices[0].message.content
+    _store(path, content)
+    return content
@@ -1,15 +1,32 @@
 import os
+import asyncio
+import hashlib
 import json
-import time
+import random
 import re
+import shutil
+import tempfile
+import threading
+import time
 import argparse
 import sys
 import logging
-import requests
+import aiohttp
 import dashscope
-from dashscope import Generation, ImageSynthesis
+import numpy as np
+from dashscope import ImageSynthesis
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache, partial
+from _llm_cache import DEFAULT_TTL, cached_call, evict
+
+# tiktoken 为可选依赖，未安装时按字符数粗略估算 token
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
 
 # ================= 配置区 =================
 # 统一使用 QWEN_API_KEY
@@ -27,13 +44,53 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 FONT_BOLD = os.path.join(CURRENT_DIR, "font.ttc") 
 FONT_REGULAR = os.path.join(CURRENT_DIR, "font.ttc")
 
+# 提示词优化阶段同时在途的 LLM 请求数
+MAX_CONCURRENT_PROMPTS = 5
+# 同时在途的文生图请求数（按 DashScope RPM 配额设置）与图片下载数
+MAX_CONCURRENT_SYNTH = 3
+MAX_CONCURRENT_DOWNLOADS = 8
+# 出图消费者数（包含等待下载、排版的任务，实际并发仍由上面两个信号量控制）
+IMAGE_WORKERS = 8
+
+# 出图重试：指数退避（带随机抖动）的基数与上限（秒）；4xx 参数/鉴权错误不重试
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 60
+NON_RETRYABLE_STATUS = (400, 401, 403, 404)
+
+# 文字排版使用的线程数（PIL 绘制时释放 GIL）
+OVERLAY_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# 文生图参数
+IMAGE_MODEL = "qwen-image-plus"
+NEGATIVE_PROMPT = "text, watermark, signature, logo, low quality, blurry, distorted, ugly"
+IMAGE_SIZE = "1328*1328"
+# 原图（未加文字）按生成参数缓存，重跑时跳过 DashScope
+IMAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xhs_agent", "img")
+# 设计方案/提示词按文章内容哈希缓存：最近使用的若干条，超过有效期的不再复用
+PLAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xhs_agent", "plan")
+PLAN_CACHE_TTL = 86400 * 7
+PLAN_CACHE_MAX_FILES = 128
+
+# 文字描边宽度（代替偏移阴影，只需绘制一次）
+TEXT_STROKE_WIDTH = 3
+# 成图 PNG 的 zlib 压缩级别（默认 6 很慢）
+PNG_COMPRESS_LEVEL = 1
+
+# 文章送入设计阶段前的 token 预算；超出时保留开头与结尾
+ARTICLE_TOKEN_BUDGET = 6000
+ARTICLE_HEAD_TOKENS = 3000
+ARTICLE_TAIL_TOKENS = 2500
+
+# LLM 回复中的 ```json 代码块
+_JSON_FENCE_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("image_gen.log", mode='a', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
+        logging.StreamHandler(sys.stderr)
     ]
 )
 logger = logging.getLogger(__name__)
@@ -45,7 +102,17 @@ def read_article_content(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def design_image_content(article_content):
+def fit_article_budget(article):
+    """文章超出 ARTICLE_TOKEN_BUDGET 时截取首尾，避免请求超出模型上下文。"""
+    # 无 tiktoken 时按字符切分（中文大致一字一 token，估算偏保守）
+    tokens = _ENCODING.encode(article) if _ENCODING else article
+    if len(tokens) <= ARTICLE_TOKEN_BUDGET:
+        return article
+    kept = tokens[:ARTICLE_HEAD_TOKENS] + tokens[-ARTICLE_TAIL_TOKENS:]
+    logger.warning(f"Article truncated: {len(tokens)} -> {len(kept)} tokens ({len(kept) / len(tokens):.0%} kept)")
+    return _ENCODING.decode(kept) if _ENCODING else kept
+
+def design_image_content(article_content, refresh=False):
     logger.info("Step 1: Designing image content structure...")
     
     system_prompt = """
@@ -61,6 +128,11 @@ def design_image_content(article_content):
             "highlights": ["核心卖点1", "核心卖点2", "核心卖点3"]
         }
     - `style_mood`: 风格与氛围（如“古风、静谧、暖色调”）。
+    - `optimized_prompt`: 直接可用于文生图模型的高质量提示词（纯文本），要求：
+        * 必须明确“不要包含任何文字、水印、标题”（No text, no watermark, clean background），文字由后期代码添加；
+        * 根据 `text_content` 在画面中预留留白区域（如天空、墙面、水面）以便排版；
+        * 用高画质摄影语言扩充场景（如“8k分辨率”、“柔和光线”、“景深”、“构图完美”）；
+        * 包含“小红书风格”、“精致排版背景”、“美学设计”等关键词。
     
     **规划要求**：
     1. **封面图**：要有吸引眼球的大标题（如“苏州旅游避雷指南”）和核心亮点列表。
@@ -76,7 +148,8 @@ def design_image_content(article_content):
                 "subtitle": "2025冬季保姆级攻略",
                 "highlights": ["山塘夜游", "苏博几何", "西园寺撸猫"]
             },
-            "style_mood": "清新淡雅，杂志封面感"
+            "style_mood": "清新淡雅，杂志封面感",
+            "optimized_prompt": "小红书风格，精致排版背景，美学设计，苏州博物馆几何建筑与平江路小桥流水拼贴，画面上方大面积留白天空，柔和自然光，景深，构图完美，8k分辨率，不要包含任何文字、水印、标题，no text, no watermark, clean background"
         }
     ]
     """
@@ -84,91 +157,123 @@ def design_image_content(article_content):
     user_prompt = f"文章内容如下：\n\n{article_content}"
 
     try:
-        response = Generation.call(
-            model="qwen-plus",
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            result_format='message'
-        )
-
-        if response.status_code == 200:
-            content = response.output.choices[0].message.content
-            # 提取 JSON
-            match = re.search(r'```json\s*(.*?)\s*```', content, re.DOTALL)
-            json_str = match.group(1) if match else content
-            # 清理可能存在的非JSON字符
-            json_str = json_str.strip()
-            parsed_json = json.loads(json_str)
-            logger.info(f"Designed Content: {json.dumps(parsed_json, ensure_ascii=False, indent=2)}")
-            return parsed_json
-        else:
-            logger.error(f"Failed to design content. Code: {response.code}")
-            return []
+        content = cached_call("qwen-plus", system_prompt, user_prompt, ttl=0 if refresh else DEFAULT_TTL)
+    except Exception as e:
+        logger.error(f"Failed to design content: {e}")
+        return []
+
+    try:
+        # 提取 JSON：回复本身就是 JSON 时直接解析，否则再找代码块
+        json_str = content.strip()
+        if not json_str.startswith(('[', '{')):
+            match = _JSON_FENCE_RE.search(content)
+            if match:
+                json_str = match.group(1).strip()
+        parsed_json = json.loads(json_str)
+        logger.info(f"Designed Content: {json.dumps(parsed_json, ensure_ascii=False, indent=2)}")
+        return parsed_json
     except Exception as e:
+        # 无法解析的回复不留在缓存里，下次重新生成
+        evict("qwen-plus", system_prompt, user_prompt)
         logger.error(f"Error during design phase: {e}")
         return []
 
-def optimize_prompts(design_plan):
-    logger.info("Step 2: Optimizing image generation prompts...")
+def inline_prompts(design_plan):
+    """设计方案已自带 optimized_prompt 时直接转成出图列表；任一条缺失则返回 None，改走逐条优化。"""
+    final_prompts = []
+    for item in design_plan:
+        prompt = item.get('optimized_prompt') if isinstance(item, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip() or 'filename' not in item:
+            return None
+        final_prompts.append({
+            "filename": item['filename'],
+            "prompt": prompt.strip(),
+            "text_content": item.get('text_content', {})
+        })
+    return final_prompts
+
+def _optimize_one(item, refresh=False):
+    system_prompt = """
+    你是一位精通 AI 绘画的提示词工程师。
+    你的任务是将用户的“图片设计方案”转化为一段高质量的、描述精准的**图像生成提示词（Prompt）**。
     
-    optimized_list = []
+    **关键要求**：
+    1. **纯净画面**：提示词中必须明确要求**“不要包含任何文字!!、水印、标题”**（No text, no watermark, clean background）。我们将在后期通过代码添加文字。
+    2. **留白构图**：根据文字内容（标题、列表），在画面中预留合适的留白区域（如天空、墙面、水面），以便后期排版文字。
+    3. **画面描述**：将场景描述扩充为高画质摄影语言（如“8k分辨率”、“柔和光线”、“景深”、“构图完美”）。
+    4. **风格统一**：确保所有提示词都包含“小红书风格”、“精致排版背景”、“美学设计”等关键词。
+    5. **直接输出**：只输出最终的 Prompt 文本，不要解释。
+    """
     
-    for item in design_plan:
-        system_prompt = """
-        你是一位精通 AI 绘画的提示词工程师。
-        你的任务是将用户的“图片设计方案”转化为一段高质量的、描述精准的**图像生成提示词（Prompt）**。
-        
-        **关键要求**：
-        1. **纯净画面**：提示词中必须明确要求**“不要包含任何文字!!、水印、标题”**（No text, no watermark, clean background）。我们将在后期通过代码添加文字。
-        2. **留白构图**：根据文字内容（标题、列表），在画面中预留合适的留白区域（如天空、墙面、水面），以便后期排版文字。
-        3. **画面描述**：将场景描述扩充为高画质摄影语言（如“8k分辨率”、“柔和光线”、“景深”、“构图完美”）。
-        4. **风格统一**：确保所有提示词都包含“小红书风格”、“精致排版背景”、“美学设计”等关键词。
-        5. **直接输出**：只输出最终的 Prompt 文本，不要解释。
-        """
-        
-        user_prompt = f"""
-        设计方案如下：
-        - 场景：{item['visual_scene']}
-        - 风格：{item['style_mood']}
-        - 需要预留位置给文字：{json.dumps(item['text_content'], ensure_ascii=False)}
-        
-        请生成一段用于文生图模型的 Prompt。
-        """
-        
-        try:
-            response = Generation.call(
-                model="qwen-plus",
-                messages=[
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_prompt}
-                ],
-                result_format='message'
-            )
-            
-            if response.status_code == 200:
-                final_prompt = response.output.choices[0].message.content
-                optimized_list.append({
-                    "filename": item['filename'],
-                    "prompt": final_prompt,
-                    "text_content": item['text_content'] # 传递文字内容给后续步骤
-                })
-                logger.info(f"  -> Optimized prompt for {item['filename']}")
-            else:
-                logger.error(f"  -> Failed to optimize {item['filename']}")
-                
-        except Exception as e:
-            logger.error(f"Error optimizing prompt for {item['filename']}: {e}")
-            
-    return optimized_list
+    user_prompt = f"""
+    设计方案如下：
+    - 场景：{item['visual_scene']}
+    - 风格：{item['style_mood']}
+    - 需要预留位置给文字：{json.dumps(item['text_content'], ensure_ascii=False)}
+    
+    请生成一段用于文生图模型的 Prompt。
+    """
+    
+    try:
+        final_prompt = cached_call("qwen-plus", system_prompt, user_prompt, ttl=0 if refresh else DEFAULT_TTL)
+        logger.info(f"  -> Optimized prompt for {item['filename']}")
+        return {
+            "filename": item['filename'],
+            "prompt": final_prompt,
+            "text_content": item['text_content'] # 传递文字内容给后续步骤
+        }
+    except Exception as e:
+        logger.error(f"Error optimizing prompt for {item['filename']}: {e}")
+    return None
+
+async def optimize_prompts(design_plan, refresh=False, queue=None):
+    logger.info("Step 2: Optimizing image generation prompts...")
+    
+    # 每条设计互不依赖，并发发起（Generation.call 为阻塞调用，放入线程池执行）
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PROMPTS)
+
+    async def _bounded(idx, item):
+        async with sem:
+            result = await loop.run_in_executor(None, partial(_optimize_one, item, refresh))
+        # 优化完一条就立刻交给出图队列，不必等其余条目
+        if queue is not None and isinstance(result, dict):
+            queue.put_nowait((idx, result))
+        return result
+
+    results = await asyncio.gather(*[_bounded(i, item) for i, item in enumerate(design_plan)], return_exceptions=True)
+    # gather 保持输入顺序，失败项直接丢弃
+    return [r for r in results if isinstance(r, dict)]
+
+def _font(path, size, index=0):
+    # FreeType 字体对象不保证线程安全，每个排版线程各自缓存一份
+    return _font_for_thread(threading.get_ident(), path, size, index)
+
+@lru_cache(maxsize=128)
+def _font_for_thread(thread_id, path, size, index):
+    # 解析 .ttc 开销较大，同一线程内同一路径/字号只加载一次
+    return ImageFont.truetype(path, size, index=index)
+
+def _gradient_column(height, is_cover):
+    """按行计算蒙版透明度，返回长度为 height 的 uint8 数组。"""
+    ys = np.arange(height, dtype=np.float64)
+    if is_cover:
+        # 底部 50% 向下渐深，顶部 30% 向上渐深，两段取较大值
+        bottom = np.clip((ys - height * 0.5) / (height * 0.5), 0, 1) * 190
+        top = np.clip((height * 0.3 - ys) / (height * 0.3), 0, 1) * 110
+        return np.maximum(bottom, top).astype(np.uint8)
+    # 仅底部 40% 向下渐深
+    return (np.clip((ys - height * 0.6) / (height * 0.4), 0, 1) * 200).astype(np.uint8)
 
 def add_text_overlay(image_path, text_content):
     """
     使用 PIL 在图片上添加文字 (字号适中版)
     """
     try:
-        img = Image.open(image_path).convert("RGBA")
+        # 压暗与绘字都直接在 RGB 上完成，无需 RGBA 往返转换
+        img = Image.open(image_path)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
         width, height = img.size
         
         is_cover = "cover" in os.path.basename(image_path).lower()
@@ -187,11 +292,9 @@ def add_text_overlay(image_path, text_content):
         
         try:
             # .ttc 必须保留 index 参数 (index=0 通常为常规体)
-            font_title = ImageFont.truetype(FONT_BOLD, title_size, index=0)
-            font_subtitle = ImageFont.truetype(FONT_BOLD, subtitle_size, index=0)
-            font_highlight = ImageFont.truetype(FONT_REGULAR, highlight_size, index=0)
-            
-            logger.info(f"✅ Loaded custom font: {FONT_BOLD}")
+            font_title = _font(FONT_BOLD, title_size, 0)
+            font_subtitle = _font(FONT_BOLD, subtitle_size, 0)
+            font_highlight = _font(FONT_REGULAR, highlight_size, 0)
             
         except Exception as e:
             logger.error(f"❌ Font loading failed: {e}. Fallback to default.")
@@ -199,29 +302,12 @@ def add_text_overlay(image_path, text_content):
             font_subtitle = ImageFont.load_default()
             font_highlight = ImageFont.load_default()
 
-        # 添加半透明蒙版以增强文字可读性
-        gradient = Image.new('L', (width, height), color=0)
-        
-        if is_cover:
-             for y in range(height):
-                if y > height * 0.5:
-                    alpha = int((y - height * 0.5) / (height * 0.5) * 190)
-                    for x in range(width):
-                        gradient.putpixel((x, y), max(gradient.getpixel((x, y)), alpha))
-                if y < height * 0.3:
-                    alpha = int((height * 0.3 - y) / (height * 0.3) * 110)
-                    for x in range(width):
-                        gradient.putpixel((x, y), max(gradient.getpixel((x, y)), alpha))
-        else:
-            for y in range(height):
-                if y > height * 0.6:
-                    alpha = int((y - height * 0.6) / (height * 0.4) * 200)
-                    for x in range(width):
-                        gradient.putpixel((x, y), alpha)
-        
-        overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-        overlay.paste((0, 0, 0, 255), (0, 0), mask=gradient)
-        img = Image.alpha_composite(img, overlay)
+        # 添加半透明蒙版以增强文字可读性（蒙版只随行变化，整行同值）
+        # 叠加黑色蒙版等价于按透明度直接压暗像素，一次乘法完成
+        col = _gradient_column(height, is_cover)
+        arr = np.asarray(img, dtype=np.float32)
+        arr *= 1.0 - col[:, None, None].astype(np.float32) / 255.0
+        img = Image.fromarray(arr.astype(np.uint8))
         draw = ImageDraw.Draw(img)
 
         # 布局逻辑自动根据字号计算，无需修改
@@ -237,8 +323,7 @@ def add_text_overlay(image_path, text_content):
                 x = (width - text_w) / 2
                 y = height * 0.3
                 
-                draw.text((x + 5, y + 5), text, font=font_title, fill=(0, 0, 0, 180))
-                draw.text((x, y), text, font=font_title, fill=(255, 255, 255, 255))
+                draw.text((x, y), text, font=font_title, fill=(255, 255, 255), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
                 
                 last_y = y + text_h + 35
 
@@ -250,8 +335,7 @@ def add_text_overlay(image_path, text_content):
                 x = (width - text_w) / 2
                 y = last_y
                 
-                draw.text((x + 3, y + 3), text, font=font_subtitle, fill=(0, 0, 0, 180))
-                draw.text((x, y), text, font=font_subtitle, fill=(255, 255, 0, 255))
+                draw.text((x, y), text, font=font_subtitle, fill=(255, 255, 0), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
                 
             if "highlights" in text_content and text_content["highlights"]:
                 highlights = text_content["highlights"]
@@ -266,8 +350,7 @@ def add_text_overlay(image_path, text_content):
                     x = (width - text_w) / 2
                     current_y -= (text_h + 25)
                     
-                    draw.text((x + 2, current_y + 2), text, font=font_highlight, fill=(0, 0, 0, 180))
-                    draw.text((x, current_y), text, font=font_highlight, fill=(255, 255, 255, 255))
+                    draw.text((x, current_y), text, font=font_highlight, fill=(255, 255, 255), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
 
         else:
             # === 普通布局 (左对齐) ===
@@ -283,8 +366,7 @@ def add_text_overlay(image_path, text_content):
                     text_h = bbox[3] - bbox[1]
                     current_y -= (text_h + 25)
                     
-                    draw.text((margin_left + 2, current_y + 2), text, font=font_highlight, fill=(0, 0, 0, 180))
-                    draw.text((margin_left, current_y), text, font=font_highlight, fill=(255, 255, 255, 255))
+                    draw.text((margin_left, current_y), text, font=font_highlight, fill=(255, 255, 255), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
                 
                 current_y -= 40
 
@@ -294,8 +376,7 @@ def add_text_overlay(image_path, text_content):
                 text_h = bbox[3] - bbox[1]
                 current_y -= (text_h + 25)
                 
-                draw.text((margin_left + 3, current_y + 3), text, font=font_subtitle, fill=(0, 0, 0, 180))
-                draw.text((margin_left, current_y), text, font=font_subtitle, fill=(255, 255, 0, 255))
+                draw.text((margin_left, current_y), text, font=font_subtitle, fill=(255, 255, 0), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
                 
                 current_y -= 25
 
@@ -305,83 +386,249 @@ def add_text_overlay(image_path, text_content):
                 text_h = bbox[3] - bbox[1]
                 current_y -= (text_h + 35)
                 
-                draw.text((margin_left + 4, current_y + 4), text, font=font_title, fill=(0, 0, 0, 180))
-                draw.text((margin_left, current_y), text, font=font_title, fill=(255, 255, 255, 255))
+                draw.text((margin_left, current_y), text, font=font_title, fill=(255, 255, 255), stroke_width=TEXT_STROKE_WIDTH, stroke_fill=(0, 0, 0))
 
-        img = img.convert("RGB")
-        img.save(image_path)
+        # 小红书上传后会重新编码，PNG 用最低压缩级别换取更快的写盘；其他格式按扩展名保存
+        if image_path.lower().endswith('.png'):
+            img.save(image_path, format='PNG', compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+        else:
+            img.save(image_path)
         logger.info(f"Text overlay added to {image_path}")
 
     except Exception as e:
         logger.error(f"Error adding text overlay: {e}")
 
-def generate_images(prompts_list, output_dir):
-    logger.info(f"Step 3: Generating {len(prompts_list)} images...")
-    generated_files = []
-    
-    for item in prompts_list:
-        filename = item['filename']
-        prompt_text = item['prompt']
-        text_content = item.get('text_content', {})
-        
-        # 强制不生成文字的 Prompt
-        final_prompt = f"{prompt_text}, no text, no watermark, clean background, 杰作, 最佳画质, 8k"
-        
-        logger.info(f"Generating {filename}...")
-        
-        max_retries = 3
-        for attempt in range(max_retries):
+def _image_cache_path(prompt):
+    key = hashlib.sha256((IMAGE_MODEL + prompt + NEGATIVE_PROMPT + IMAGE_SIZE).encode("utf-8")).hexdigest()
+    return os.path.join(IMAGE_CACHE_DIR, f"{key}.png")
+
+def _store_image_cache(file_path, cache_path):
+    # 先拷到临时文件再改名，避免中途失败留下半张图
+    tmp = None
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=IMAGE_CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(file_path, tmp)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        logger.warning(f"  -> Failed to cache raw image: {e}")
+        # 成功 replace 后临时文件已不存在，只有失败时才需要清理
+        if tmp is not None:
             try:
-                rsp = ImageSynthesis.call(
-                    model="qwen-image-plus",
+                os.remove(tmp)
+            except OSError:
+                pass
+
+def _new_http_session():
+    # 下载用的 HTTP 会话：每次运行一个，运行结束时关闭（MCP 进程内多次调用也不泄漏连接）
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=MAX_CONCURRENT_DOWNLOADS),
+        timeout=aiohttp.ClientTimeout(total=120)
+    )
+
+async def _download_image(session, image_url, file_path):
+    # 分块写盘，不把整张图读进内存
+    async with session.get(image_url) as img_response:
+        img_response.raise_for_status()
+        with open(file_path, "wb") as f:
+            async for chunk in img_response.content.iter_chunked(1 << 16):
+                f.write(chunk)
+
+# 排版线程池：首次使用时创建，排版不占用事件循环。
+# 不用进程池：流水线运行在多线程的 MCP 服务进程内，fork 出的子进程可能死锁
+_OVERLAY_POOL = None
+
+def _get_overlay_pool():
+    global _OVERLAY_POOL
+    if _OVERLAY_POOL is None:
+        _OVERLAY_POOL = ThreadPoolExecutor(max_workers=OVERLAY_WORKERS, thread_name_prefix="overlay")
+    return _OVERLAY_POOL
+
+async def _overlay(file_path, text_content):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_get_overlay_pool(), add_text_overlay, file_path, text_content)
+    except Exception as e:
+        logger.error(f"Error adding text overlay: {e}")
+
+async def _generate_one(item, output_dir, session, synth_sem, download_sem):
+    filename = item['filename']
+    prompt_text = item['prompt']
+    text_content = item.get('text_content', {})
+    
+    # 强制不生成文字的 Prompt
+    final_prompt = f"{prompt_text}, no text, no watermark, clean background, 杰作, 最佳画质, 8k"
+    
+    file_path = os.path.join(output_dir, filename)
+    cache_path = _image_cache_path(final_prompt)
+    try:
+        shutil.copyfile(cache_path, file_path)
+    except OSError:
+        # 没有缓存（或刚被清理掉）时照常出图
+        pass
+    else:
+        logger.info(f"  -> {filename}: reused cached raw image")
+        await _overlay(file_path, text_content)
+        return file_path
+
+    logger.info(f"Generating {filename}...")
+    loop = asyncio.get_running_loop()
+    
+    max_retries = 3
+    for attempt in range(max_retries):
+        rsp = None
+        try:
+            # ImageSynthesis.call 为阻塞调用，放入线程池执行；信号量控制同时在途的请求数
+            async with synth_sem:
+                rsp = await loop.run_in_executor(None, partial(
+                    ImageSynthesis.call,
+                    model=IMAGE_MODEL,
                     prompt=final_prompt,
-                    negative_prompt="text, watermark, signature, logo, low quality, blurry, distorted, ugly",
-                    size="1328*1328",
+                    negative_prompt=NEGATIVE_PROMPT,
+                    size=IMAGE_SIZE,
                     n=1
-                )
-
-                if rsp.status_code == 200:
-                    if rsp.output and rsp.output.results:
-                        image_url = rsp.output.results[0].url
-                        logger.info("  -> Success. Downloading...")
-                        
-                        img_response = requests.get(image_url)
-                        img_response.raise_for_status()
-                        
-                        file_path = os.path.join(output_dir, filename)
-                        with open(file_path, "wb") as f:
-                            f.write(img_response.content)
-                        logger.info(f"  -> Saved raw image to {file_path}")
-                        
-                        # === 关键步骤：添加文字覆盖 ===
-                        add_text_overlay(file_path, text_content)
-                        
-                        generated_files.append(file_path)
-                        break 
-                    else:
-                        logger.warning(f"  -> Attempt {attempt+1}: No results. Response: {rsp}")
-                else:
-                    logger.warning(f"  -> Attempt {attempt+1}: Failed. Code: {rsp.status_code}, Message: {rsp.message}")
+                ))
 
-            except Exception as e:
-                logger.error(f"  -> Attempt {attempt+1}: Error: {e}")
-            
-            if attempt < max_retries - 1:
-                logger.info("  -> Retrying in 5 seconds...")
-                time.sleep(5)
+            if rsp.status_code == 200:
+                if rsp.output and rsp.output.results:
+                    image_url = rsp.output.results[0].url
+                    logger.info(f"  -> {filename} success. Downloading...")
+                    
+                    async with download_sem:
+                        await _download_image(session, image_url, file_path)
+                    logger.info(f"  -> Saved raw image to {file_path}")
+                    # 加文字前先存一份原图
+                    _store_image_cache(file_path, cache_path)
+                    
+                    # === 关键步骤：添加文字覆盖 ===
+                    await _overlay(file_path, text_content)
+                    
+                    return file_path
+                else:
+                    logger.warning(f"  -> {filename} attempt {attempt+1}: No results. Response: {rsp}")
+            elif rsp.status_code in NON_RETRYABLE_STATUS:
+                logger.error(f"  -> {filename}: Failed without retry. Code: {rsp.status_code}, Message: {rsp.message}")
+                return None
             else:
-                logger.error(f"  -> Failed to generate {filename} after {max_retries} attempts.")
-        
-        time.sleep(2)
+                logger.warning(f"  -> {filename} attempt {attempt+1}: Failed. Code: {rsp.status_code}, Message: {rsp.message}")
+
+        except Exception as e:
+            logger.error(f"  -> {filename} attempt {attempt+1}: Error: {e}")
         
-    return generated_files
+        if attempt < max_retries - 1:
+            # 指数退避加随机抖动，避免多张图同时重试
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, 1))
+            logger.info(f"  -> Retrying {filename} in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+        else:
+            logger.error(f"  -> Failed to generate {filename} after {max_retries} attempts.")
+    return None
+
+async def generate_images(queue, output_dir, session):
+    """从队列取 (序号, 提示词) 出图，取到 None 结束；返回按序号排列的图片路径。"""
+    logger.info("Step 3: Generating images as prompts become ready...")
+    synth_sem = asyncio.Semaphore(MAX_CONCURRENT_SYNTH)
+    download_sem = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    
+    results = {}
+
+    async def _worker():
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                # 结束标记放回队列，留给其他消费者
+                queue.put_nowait(None)
+                return
+            idx, item = entry
+            results[idx] = await _generate_one(item, output_dir, session, synth_sem, download_sem)
+
+    await asyncio.gather(*[_worker() for _ in range(IMAGE_WORKERS)])
+    # 按设计顺序输出，封面仍排在第一位
+    return [results[idx] for idx in sorted(results) if results[idx]]
 
-def main(file_path):
+def _load_artifact(path):
+    try:
+        if time.time() - os.path.getmtime(path) > PLAN_CACHE_TTL:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # 命中时刷新 mtime，清理时按最近使用时间淘汰
+        os.utime(path)
+        return data
+    except (OSError, ValueError):
+        return None
+
+def _prune_artifacts():
+    """删除过期的缓存文件，并只保留最近使用的 PLAN_CACHE_MAX_FILES 个。"""
+    try:
+        entries = []
+        for entry in os.scandir(PLAN_CACHE_DIR):
+            if entry.is_file() and entry.name.endswith(".json"):
+                entries.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    now = time.time()
+    for i, (mtime, path) in enumerate(entries):
+        if i >= PLAN_CACHE_MAX_FILES or now - mtime > PLAN_CACHE_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _save_artifact(path, data):
+    try:
+        os.makedirs(PLAN_CACHE_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        logger.warning(f"Failed to save {path}: {e}")
+        return
+    _prune_artifacts()
+
+async def _prompts_and_images(design_plan, prompts_path, output_dir, session, force):
+    """准备提示词并出图，返回图片路径列表；没有可用提示词时返回 None。"""
+    # 提示词优化与出图重叠进行：优化好的条目经队列直接进入出图
+    queue = asyncio.Queue()
+    images_task = asyncio.create_task(generate_images(queue, output_dir, session))
+    try:
+        final_prompts = None if force else _load_artifact(prompts_path)
+        if final_prompts:
+            logger.info(f"Step 2: Reusing optimized prompts from {prompts_path}")
+        else:
+            # 设计阶段已一并给出提示词时，省去逐条优化的 N 次 LLM 调用
+            final_prompts = inline_prompts(design_plan)
+            if final_prompts:
+                logger.info("Step 2: Using prompts returned with the design plan")
+        if final_prompts:
+            for entry in enumerate(final_prompts):
+                queue.put_nowait(entry)
+        else:
+            logger.info("Design plan has no usable optimized_prompt, optimizing per item...")
+            final_prompts = await optimize_prompts(design_plan, force, queue)
+            # 只有全部条目都优化成功才落盘，避免下次复用残缺的列表
+            if final_prompts and len(final_prompts) == len(design_plan):
+                _save_artifact(prompts_path, final_prompts)
+    except BaseException:
+        # 提示词阶段出错：出图任务不再有意义，取消并等它退出，不留悬挂的任务
+        images_task.cancel()
+        try:
+            await images_task
+        except BaseException:
+            pass
+        raise
+    queue.put_nowait(None)
+    generated_files = await images_task
+    return generated_files if final_prompts else None
+
+async def main(file_path, force=False):
+    """执行配图流水线，成功时返回 {"output_dir": ..., "images": [...]}，失败返回 None。"""
     logger.info(f"🚀 Starting Image Generation Pipeline for: {file_path}")
     
     if not os.path.exists(file_path):
         logger.error(f"Input file not found: {file_path}")
-        return
+        return None
 
     base_dir = os.path.dirname(file_path)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -390,33 +637,46 @@ def main(file_path):
     
     content = read_article_content(file_path)
     if not content:
-        return
+        return None
+    content = fit_article_budget(content)
 
-    design_plan = design_image_content(content)
-    if not design_plan:
-        logger.error("Design plan failed.")
-        return
+    # 设计方案与提示词按文章内容哈希缓存，重跑时直接复用
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    plan_path = os.path.join(PLAN_CACHE_DIR, f"plan_{content_hash}.json")
+    prompts_path = os.path.join(PLAN_CACHE_DIR, f"prompts_{content_hash}.json")
+
+    design_plan = None if force else _load_artifact(plan_path)
+    if design_plan:
+        logger.info(f"Step 1: Reusing design plan from {plan_path}")
+    else:
+        # 阻塞的 LLM 调用放到线程里，进程内被 MCP 调用时不卡住事件循环
+        design_plan = await asyncio.to_thread(design_image_content, content, force)
+        if not design_plan:
+            logger.error("Design plan failed.")
+            return None
+        _save_artifact(plan_path, design_plan)
 
-    final_prompts = optimize_prompts(design_plan)
-    if not final_prompts:
+    async with _new_http_session() as session:
+        generated_files = await _prompts_and_images(design_plan, prompts_path, output_dir, session, force)
+
+    if generated_files is None:
         logger.error("Prompt optimization failed.")
-        return
+        return None
+    if not generated_files:
+        return None
 
-    generated_files = generate_images(final_prompts, output_dir)
-    
-    if generated_files:
-        print(f"__IMAGES_START__")
-        for path in generated_files:
-            print(path)
-        print(f"__IMAGES_END__")
-        print(f"__OUTPUT_DIR__: {output_dir}")
-        logger.info("🎉 All images generated successfully!")
-    else:
-        print("Error: No images were generated.")
+    logger.info("🎉 All images generated successfully!")
+    return {"output_dir": output_dir, "images": generated_files}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--file", type=str, required=True, help="Path to the markdown article")
+    parser.add_argument("--force", action="store_true", help="Ignore saved design plan / prompts and cached LLM replies, regenerate them")
     args = parser.parse_args()
     
-    main(args.file)
\ No newline at end of file
+    result = asyncio.run(main(args.file, force=args.force))
+    # 结束时输出一行 JSON 结果（不是逐图进度），调用方取该行解析即可
+    if result:
+        print(json.dumps({"event": "images_done", "paths": result["images"], "output_dir": result["output_dir"]}, ensure_ascii=False))
+    else:
+        print(json.dumps({"event": "error", "message": "No images were generated."}))
@@ -1,6 +1,8 @@
 import asyncio
+import json
 import os
 import sys
+from collections import deque
 from mcp.server.fastmcp import FastMCP
 
 # ================= 配置区 =================
@@ -8,62 +10,116 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 IMAGE_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "image_gen_cli.py")
 # 使用统一环境 Python
 PYTHON_EXECUTABLE = sys.executable
+# 只保留子进程最近的日志行，用于出错时回显
+LOG_TAIL_LINES = 500
+# 设置 IMAGE_GEN_SUBPROCESS=1 时改回每次调用拉起子进程
+USE_SUBPROCESS = os.getenv("IMAGE_GEN_SUBPROCESS") == "1"
+# 同时进行的配图任务数上限（单个任务内部已并发调用 DashScope）
+MAX_CONCURRENT_RUNS = 1
 # =========================================
 
+# 默认同进程直接导入配图流水线，字体缓存等模块级对象可跨调用复用
+run_image_pipeline = None
+if not USE_SUBPROCESS:
+    sys.path.insert(0, PROJECT_ROOT)
+    try:
+        from image_gen_cli import main as run_image_pipeline
+    except ImportError:
+        run_image_pipeline = None
+
+_IMAGE_SEM = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+
 mcp = FastMCP("XHS Image Generator")
 
+def _format_result(image_list, output_dir):
+    output_dir_info = f"\n📂 图片保存目录: {output_dir}" if output_dir else ""
+    return f"✅ 图片生成完毕！共生成 {len(image_list)} 张。\n{output_dir_info}\n\n图片列表:\n" + "\n".join([f"- {os.path.basename(img)}" for img in image_list])
+
+async def _drain(stream, tail):
+    # 逐行读取，只留最后若干行，避免整段日志堆在内存里
+    async for raw in stream:
+        tail.append(raw.decode(errors="replace").rstrip())
+
+async def _generate_in_process(article_path: str) -> str:
+    # 流水线只通过 logging 输出（StreamHandler 指向 stderr），不会写 stdout 干扰 MCP stdio 协议
+    result = await run_image_pipeline(article_path)
+    if not result:
+        return "❌ Image generation failed. See image_gen.log for details."
+    return _format_result(result["images"], result["output_dir"])
+
+async def _generate_via_subprocess(article_path: str) -> str:
+    cmd = [PYTHON_EXECUTABLE, IMAGE_SCRIPT_PATH, "--file", article_path]
+
+    print(f"[Debug] Executing: {' '.join(cmd)}", file=sys.stderr)
+
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=PROJECT_ROOT,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=1 << 20
+    )
+
+    # 图片生成比较慢：边读边解析结果行，stderr 同时排空以免管道写满阻塞子进程
+    stdout_tail = deque(maxlen=LOG_TAIL_LINES)
+    stderr_tail = deque(maxlen=LOG_TAIL_LINES)
+    stderr_task = asyncio.create_task(_drain(process.stderr, stderr_tail))
+
+    image_list = []
+    output_dir = None
+    async for raw in process.stdout:
+        line = raw.decode(errors="replace").rstrip()
+        # CLI 结束时输出一行 JSON 结果，其余行都是日志
+        if line.startswith("{"):
+            try:
+                result = json.loads(line)
+            except ValueError:
+                result = None
+            if isinstance(result, dict) and result.get("event") == "images_done":
+                image_list = result.get("paths") or []
+                output_dir = result.get("output_dir")
+                continue
+        stdout_tail.append(line)
+
+    await stderr_task
+    await process.wait()
+    output = "\n".join(stdout_tail)
+    error_output = "\n".join(stderr_tail)
+
+    if process.returncode != 0:
+        return f"❌ Image generation failed.\nError:\n{error_output}\nOutput:\n{output}"
+
+    # 提取结果
+    if image_list:
+        return _format_result(image_list, output_dir)
+    else:
+        return f"⚠️ Script finished but no images returned.\nLast output:\n{output[-500:]}\n{error_output[-500:]}"
+
+async def _generate_exclusive(article_path: str) -> str:
+    async with _IMAGE_SEM:
+        if run_image_pipeline:
+            return await _generate_in_process(article_path)
+        return await _generate_via_subprocess(article_path)
+
 @mcp.tool()
 async def generate_images_from_article(article_path: str) -> str:
     """
     Generate Xiaohongshu-style cover and content images based on the generated markdown article.
-    
+
     Args:
         article_path: The absolute path to the generated markdown file (e.g., .../final_post_xxx.md).
     """
-    print(f"--- [MCP-Artist] Designing & Generating images for: {os.path.basename(article_path)} ---")
+    print(f"--- [MCP-Artist] Designing & Generating images for: {os.path.basename(article_path)} ---", file=sys.stderr)
 
     try:
         if not os.path.exists(article_path):
             return f"❌ Error: Article file not found at {article_path}"
 
-        cmd = [PYTHON_EXECUTABLE, IMAGE_SCRIPT_PATH, "--file", article_path]
-        
-        print(f"[Debug] Executing: {' '.join(cmd)}")
-
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=PROJECT_ROOT,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        # 图片生成比较慢，设置较长的超时或实时读取（这里简化为等待）
-        stdout, stderr = await process.communicate()
-        output = stdout.decode().strip()
-        error_output = stderr.decode().strip()
-
-        if process.returncode != 0:
-            return f"❌ Image generation failed.\nError:\n{error_output}\nOutput:\n{output}"
-
-        # 提取结果
-        if "__IMAGES_START__" in output:
-            try:
-                images_block = output.split("__IMAGES_START__")[1].split("__IMAGES_END__")[0].strip()
-                image_list = images_block.split('\n')
-                
-                output_dir_info = ""
-                if "__OUTPUT_DIR__: " in output:
-                    output_dir = output.split("__OUTPUT_DIR__: ")[1].strip()
-                    output_dir_info = f"\n📂 图片保存目录: {output_dir}"
-
-                return f"✅ 图片生成完毕！共生成 {len(image_list)} 张。\n{output_dir_info}\n\n图片列表:\n" + "\n".join([f"- {os.path.basename(img)}" for img in image_list])
-            except IndexError:
-                return f"⚠️ Output parsing error. Raw:\n{output}"
-        else:
-            return f"⚠️ Script finished but no images returned.\nLast output:\n{output[-500:]}"
+        # 客户端取消调用时不打断正在进行的生成（已消耗的额度不白费）
+        return await asyncio.shield(_generate_exclusive(article_path))
 
     except Exception as e:
         return f"❌ MCP Server Error: {str(e)}"
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    mcp.run()
@@ -15,16 +15,19 @@
 #   2) 设置密钥：export DASHSCOPE_API_KEY="你的key"
 #   3) 执行：python /Users/violet/Desktop/pythonproject/agent/main.py
 
+import asyncio
 import os
-import sys
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict
+from functools import lru_cache
+from typing import Any, List, Dict, Optional
 import  argparse
 import logging
 import re
 import json
 
+import ahocorasick
+import orjson
 from langchain_community.chat_models.tongyi import ChatTongyi
 from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
@@ -45,9 +48,7 @@ def ensure_api_key() -> str:
     return api_key
 
 
-# 允许导入 scripts 目录中的 DB 辅助函数
-sys.path.append(str(Path(__file__).parent / "scripts"))
-import connect_to_sql  # noqa: E402
+from scripts import connect_to_sql
 
 logger = logging.getLogger("agent")
 logger.setLevel(logging.INFO)
@@ -58,7 +59,7 @@ _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s")
 if not logger.handlers:
     logger.addHandler(_handler)
 
-def clamp_limit(args, user_limit: int):
+def clamp_limit(args: Any, user_limit: int) -> Any:
     if not isinstance(args, dict):
         return args
     if "limit" in args:
@@ -71,86 +72,154 @@ def clamp_limit(args, user_limit: int):
         args["limit"] = min(n, user_limit)
     return args
 
-def sanitize_text(text: str) -> str:
+# 脱敏：话题/@用户 用一个正则一次替换；敏感词交给 Aho-Corasick 自动机，
+# 单遍扫描、耗时与词表大小无关，词表可以放心扩充
+SENSITIVE_WORDS = ("色情", "暴力", "仇恨", "恐怖", "毒品", "枪支", "爆炸", "血腥", "成人", "裸露", "性", "极端", "政治", "反动")
+
+_SANITIZE_RE = re.compile(r'(?P<topic>#[^#]{1,50}#)|(?P<mention>@[\w\-\u4e00-\u9fa5]+)')
+_SANITIZE_REPL = {"topic": "[话题]", "mention": "@用户"}
+
+def _sanitize_repl(m: re.Match) -> str:
+    return _SANITIZE_REPL[m.lastgroup]
+
+# 话题/@ 标记的归一化表：全角 ＠＃ 先按字符映射成半角，再交给正则统一替换
+_MARK_TABLE = str.maketrans("＠＃", "@#")
+
+def _normalize_marks(t: str) -> str:
+    t = t.translate(_MARK_TABLE)
+    # 大多数文本不含 @ 或 #，跳过正则扫描
+    if "@" not in t and "#" not in t:
+        return t
+    return _SANITIZE_RE.sub(_sanitize_repl, t)
+
+def _build_sensitive_automaton(words) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for w in words:
+        automaton.add_word(w, len(w))
+    automaton.make_automaton()
+    return automaton
+
+_SENSITIVE_AC = _build_sensitive_automaton(SENSITIVE_WORDS)
+
+def _hide_sensitive(t: str) -> str:
+    # 命中区间按起点排序后取最左、最长且不重叠的一组（词表均为中文，无需大小写折叠）
+    spans = sorted(((end - n + 1, end + 1) for end, n in _SENSITIVE_AC.iter(t)), key=lambda x: (x[0], -x[1]))
+    if not spans:
+        return t
+    parts = []
+    pos = 0
+    for start, end in spans:
+        if start < pos:
+            continue
+        parts.append(t[pos:start])
+        parts.append("[已隐藏]")
+        pos = end
+    parts.append(t[pos:])
+    return "".join(parts)
+
+def _dumps(obj) -> str:
+    # orjson 原生输出 UTF-8（等价 ensure_ascii=False），无法序列化的类型回退为 str
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def sanitize_text(text: Any) -> str:
     try:
         t = str(text)
     except Exception:
-        t = json.dumps(text, ensure_ascii=False, default=str)
-    t = re.sub(r'#[^#]{1,50}#', '[话题]', t)
-    t = re.sub(r'@[\w\-\u4e00-\u9fa5]+', '@用户', t)
-    t = re.sub(r'(色情|暴力|仇恨|恐怖|毒品|枪支|爆炸|血腥|成人|裸露|性|极端|政治|反动)', '[已隐藏]', t, flags=re.IGNORECASE)
-    return t
+        t = _dumps(text)
+    return _hide_sensitive(_normalize_marks(t))
+
+
+_SANITIZE_KEYS = ("title", "content", "comment", "text", "topics", "screen_name")
+
+
+def _sanitize_rows_py(rows: list, keys: tuple, sanitize) -> None:
+    for item in rows:
+        if isinstance(item, dict):
+            for k in keys:
+                v = item.get(k)
+                if isinstance(v, str):
+                    item[k] = sanitize(v)
 
+# 已用 cythonize 构建 sanitize_ext 时走 C 扩展的逐行循环，否则用纯 Python 版本
+try:
+    from sanitize_ext import sanitize_rows as _sanitize_rows_impl
+except ImportError:
+    _sanitize_rows_impl = _sanitize_rows_py
 
-def sanitize_tool_result(name: str, result: str) -> str:
+
+def sanitize_rows(name: str, data: Any) -> Any:
+    """就地脱敏工具返回的 Python 对象（行列表或带 rows 的字典），返回处理后的对象。"""
     if name in ("list_tables", "describe_table"):
-        return result
-    try:
-        data = json.loads(result)
-    except Exception:
-        return sanitize_text(result)
-    keys = ("title", "content", "comment", "text", "topics", "screen_name")
-    if isinstance(data, list):
-        for item in data:
-            if isinstance(item, dict):
-                for k in keys:
-                    v = item.get(k)
-                    if isinstance(v, str):
-                        item[k] = sanitize_text(v)
-        return json.dumps(data, ensure_ascii=False, default=str)
-    if isinstance(data, dict):
-        rows = data.get("rows")
-        if isinstance(rows, list):
-            for item in rows:
-                if isinstance(item, dict):
-                    for k in keys:
-                        v = item.get(k)
-                        if isinstance(v, str):
-                            item[k] = sanitize_text(v)
-        return json.dumps(data, ensure_ascii=False, default=str)
-    return sanitize_text(result)
+        return data
+    if isinstance(data, str):
+        return sanitize_text(data)
+    rows = data.get("rows") if isinstance(data, dict) else data
+    if isinstance(rows, list):
+        _sanitize_rows_impl(rows, _SANITIZE_KEYS, sanitize_text)
+    return data
+
+
+# 工具的实际实现：返回 Python 对象，智能体内部直接使用，省去一次 JSON 往返
+def _fetch_hot_weibo(limit: int = 50, table: str = "hot_weibo"):
+    return connect_to_sql.fetch_hot_weibo(limit=limit, table=table)
+
+def _list_tables():
+    tables = connect_to_sql.list_tables()
+    return {"count": len(tables), "tables": tables}
+
+def _describe_table(table: str):
+    return connect_to_sql.describe_table(table)
+
+def _fetch_recent(table: str, limit: int = 50):
+    return connect_to_sql.fetch_recent(table=table, limit=limit)
+
+def _top_by_metric(table: str, metric: str, limit: int = 20, desc: bool = True):
+    return connect_to_sql.fetch_top_by_metric(table=table, metric=metric, limit=limit, desc=desc)
+
+def _search_rows_keyword(table: str, keyword: str, limit: int = 20):
+    return connect_to_sql.search_rows_keyword(table=table, keyword=keyword, limit=limit)
 
 
 @tool("fetch_hot_weibo")
 def fetch_hot_weibo_tool(limit: int = 50, table: str = "hot_weibo") -> str:
     """获取微博热搜结构化数据（标题、内容、评论），返回JSON。"""
-    rows = connect_to_sql.fetch_hot_weibo(limit=limit, table=table)
-    return json.dumps(rows, ensure_ascii=False, default=str)
+    return _dumps(_fetch_hot_weibo(limit=limit, table=table))
 
 @tool("list_tables")
 def list_tables_tool() -> str:
     """列出当前数据库的所有表名，返回JSON：{"count": 数量, "tables": [名称...]}."""
-    tables = connect_to_sql.list_tables()
-    return json.dumps({"count": len(tables), "tables": tables}, ensure_ascii=False, default=str)
+    return _dumps(_list_tables())
 
 @tool("describe_table")
 def describe_table_tool(table: str) -> str:
     """返回指定表的列元数据列表，字段包含 name/type/is_nullable/default/key_type/extra/comment。"""
-    cols = connect_to_sql.describe_table(table)
-    return json.dumps(cols, ensure_ascii=False, default=str)
+    return _dumps(_describe_table(table))
 
 @tool("fetch_recent")
 def fetch_recent_tool(table: str, limit: int = 50) -> str:
     """返回指定表按 created_at 降序的最近数据（若无该列则直接 LIMIT）。"""
-    rows = connect_to_sql.fetch_recent(table=table, limit=limit)
-    return json.dumps(rows, ensure_ascii=False, default=str)
+    return _dumps(_fetch_recent(table=table, limit=limit))
 
 @tool("top_by_metric")
 def top_by_metric_tool(table: str, metric: str, limit: int = 20, desc: bool = True) -> str:
     """按某数值列排序返回前N条，如 comments_count/attitudes_count/reposts_count。"""
-    rows = connect_to_sql.fetch_top_by_metric(table=table, metric=metric, limit=limit, desc=desc)
-    return json.dumps(rows, ensure_ascii=False, default=str)
+    return _dumps(_top_by_metric(table=table, metric=metric, limit=limit, desc=desc))
 
 @tool("search_rows_keyword")
 def search_rows_keyword_tool(table: str, keyword: str, limit: int = 20) -> str:
     """在常见文本列中进行关键词匹配，返回命中的前N条（title/content/comment/text/topics/screen_name）。"""
-    rows = connect_to_sql.search_rows_keyword(table=table, keyword=keyword, limit=limit)
-    return json.dumps(rows, ensure_ascii=False, default=str)
+    return _dumps(_search_rows_keyword(table=table, keyword=keyword, limit=limit))
 
 
 def build_chat_model(api_key: str) -> ChatTongyi:
     return ChatTongyi(model="qwen-flash", api_key=api_key, streaming=False)
 
+
+@lru_cache(maxsize=4)
+def get_chat_model(api_key: str) -> ChatTongyi:
+    """同一进程内共用一个模型客户端：带工具/不带工具两种调用、多个并发报告都复用它。"""
+    return build_chat_model(api_key)
+
 # 任务模板
 TASK_TEMPLATES = {
     "zhihu_daily": (
@@ -215,18 +284,73 @@ TASK_TEMPLATES = {
     ),
 }
 
+# 每个模板必须出现的二级标题，用于判断回复是否已是完整报告
+_REQUIRED_HEADINGS = {
+    task: tuple(line for line in tpl.splitlines() if line.startswith("## "))
+    for task, tpl in TASK_TEMPLATES.items()
+}
+
+
+def is_complete_report(task: str, content: str) -> bool:
+    headings = _REQUIRED_HEADINGS.get(task)
+    return bool(headings) and all(h in content for h in headings)
+
+
+# 工具名 -> 实现函数；list_tables 不接收参数，忽略模型多传的参数
+_TOOL_FUNCS = {
+    "fetch_hot_weibo": _fetch_hot_weibo,
+    "list_tables": lambda **_: _list_tables(),
+    "describe_table": _describe_table,
+    "fetch_recent": _fetch_recent,
+    "top_by_metric": _top_by_metric,
+    "search_rows_keyword": _search_rows_keyword,
+}
+
+# 绑定给模型的工具定义
+_TOOLS = [
+    fetch_hot_weibo_tool,
+    list_tables_tool,
+    describe_table_tool,
+    fetch_recent_tool,
+    top_by_metric_tool,
+    search_rows_keyword_tool,
+]
+
+
+def dispatch_tool(name: str, args):
+    """执行工具并返回 Python 对象（未序列化）。"""
+    func = _TOOL_FUNCS.get(name)
+    if func is None:
+        return {"error": f"unknown tool: {name}"}
+    try:
+        return func(**(args if isinstance(args, dict) else {}))
+    except TypeError as e:
+        return {"error": f"invalid arguments for {name}: {e}"}
+
+
+async def run_tool_call(tc: Dict, limit: int) -> ToolMessage:
+    id_ = tc.get("id")
+    name = tc.get("name")
+    args = tc.get("args")
+    if not name and tc.get("function"):
+        name = tc["function"].get("name")
+        args = tc["function"].get("arguments")
+    if isinstance(args, str):
+        try:
+            args = json.loads(args.strip() or "{}")
+        except Exception:
+            args = {}
+    args = clamp_limit(args, limit)
+    data = await asyncio.to_thread(dispatch_tool, name, args)
+    # 脱敏直接作用在行数据上，只在交给模型时序列化一次
+    return ToolMessage(content=_dumps(sanitize_rows(name, data)), tool_call_id=id_, name=name)
+
+
 # 运行智能体
-def run_agent(task: str, limit: int = 50) -> str:
+async def run_agent(task: str, limit: int = 50) -> str:
     api_key = ensure_api_key()
-    chat = build_chat_model(api_key).bind_tools([
-        fetch_hot_weibo_tool,
-        list_tables_tool,
-        describe_table_tool,
-        fetch_recent_tool,
-        top_by_metric_tool,
-        search_rows_keyword_tool,
-    ])
-    chat_no_tools = build_chat_model(api_key)
+    chat_no_tools = get_chat_model(api_key)
+    chat = chat_no_tools.bind_tools(_TOOLS)
 
     system = SystemMessage(
         content=(
@@ -269,7 +393,7 @@ def run_agent(task: str, limit: int = 50) -> str:
     max_turns = 15
     while True:
         try:
-            reply = chat.invoke(messages)
+            reply = await chat.ainvoke(messages)
         except Exception as e:
             if "DataInspectionFailed" in str(e):
                 messages.append(HumanMessage(content="请严格遵守安全规范，以概述方式撰写，不引用原文，避免敏感词与不当内容。"))
@@ -280,6 +404,10 @@ def run_agent(task: str, limit: int = 50) -> str:
             raise
         logger.info(str(reply))
         messages.append(reply)
+        # 回复里已包含模板的全部标题时直接收下，即使模型还附带了工具调用
+        if is_complete_report(task, reply.content or ""):
+            content = reply.content
+            break
         tool_calls = reply.additional_kwargs.get("tool_calls") or []
         if not tool_calls:
             content = reply.content or ""
@@ -290,42 +418,16 @@ def run_agent(task: str, limit: int = 50) -> str:
                 break
             messages.append(HumanMessage(content="请基于以上数据严格按照模板输出完整报告。"))
             continue
-        for tc in tool_calls:
-            id_ = tc.get("id")
-            name = tc.get("name")
-            args = tc.get("args")
-            if not name and tc.get("function"):
-                name = tc["function"].get("name")
-                args = tc["function"].get("arguments")
-            if isinstance(args, str):
-                try:
-                    args = json.loads(args.strip() or "{}")
-                except Exception:
-                    args = {}
-            args = clamp_limit(args, limit)
-            if name == "fetch_hot_weibo":
-                result = fetch_hot_weibo_tool.invoke(args)
-            elif name == "list_tables":
-                result = list_tables_tool.invoke(args)
-            elif name == "describe_table":
-                result = describe_table_tool.invoke(args)
-            elif name == "fetch_recent":
-                result = fetch_recent_tool.invoke(args)
-            elif name == "top_by_metric":
-                result = top_by_metric_tool.invoke(args)
-            elif name == "search_rows_keyword":
-                result = search_rows_keyword_tool.invoke(args)
-            else:
-                result = json.dumps({"error": f"unknown tool: {name}"}, ensure_ascii=False)
-            messages.append(ToolMessage(content=sanitize_tool_result(name, result), tool_call_id=id_, name=name))
-            seen_turns += 1
-            if seen_turns >= max_turns:
-                break
+        # 同一轮的多个工具调用互不依赖，并发执行（各自在线程中访问数据库）
+        batch = tool_calls[:max_turns - seen_turns]
+        tool_messages = await asyncio.gather(*[run_tool_call(tc, limit) for tc in batch])
+        messages.extend(tool_messages)
+        seen_turns += len(batch)
         if seen_turns >= max_turns:
             break
     if not content.strip():
         messages.append(HumanMessage(content="请基于以上数据严格按照模板输出完整报告，不要再调用任何工具。"))
-        final_reply = chat_no_tools.invoke(messages)
+        final_reply = await chat_no_tools.ainvoke(messages)
         content = final_reply.content or ""
     return content
 
@@ -346,15 +448,42 @@ def save_report(task: str, content: str) -> Path:
     return path
 
 
+async def _run_and_save(task: str, limit: int) -> str:
+    content = await run_agent(task=task, limit=limit)
+    logger.info(f"[{task}] 生成的报告长度：{len(content)}")
+    logger.info(f"[{task}] 报告预览：{content[:200]}")
+    # 每个报告生成完立即落盘入库，不必等其他报告
+    await asyncio.to_thread(save_report, task, content)
+    return content
+
+
+async def run_agents(tasks: List[str], limit: int = 50) -> List[Optional[str]]:
+    """多个报告互不依赖，各自的模型请求与工具调用交错并发进行。
+
+    单个报告失败只记录日志（对应位置返回 None），不影响其他报告的保存。
+    """
+    results = await asyncio.gather(*[_run_and_save(t, limit) for t in tasks], return_exceptions=True)
+    contents: List[Optional[str]] = []
+    for task, result in zip(tasks, results):
+        if isinstance(result, BaseException):
+            logger.error(f"[{task}] 报告生成失败：{result!r}", exc_info=result)
+            contents.append(None)
+        else:
+            contents.append(result)
+    return contents
+
+
 def main():
     parser = argparse.ArgumentParser(description="微博热搜数据驱动的报告生成 Agent")
-    parser.add_argument("--task", choices=list(TASK_TEMPLATES.keys()), required=True, help="报告类型")
+    parser.add_argument("--task", choices=list(TASK_TEMPLATES.keys()), nargs="+", required=True, help="报告类型，可一次指定多个")
     parser.add_argument("--limit", type=int, default=50, help="抓取的数据条数上限")
     args = parser.parse_args()
-    content = run_agent(task=args.task, limit=args.limit)
-    logger.info(f"生成的报告长度：{len(content)}")
-    logger.info(f"报告预览：{content[:200]}")
-    save_report(args.task, content)
+    tasks = list(dict.fromkeys(args.task))
+    contents = asyncio.run(run_agents(tasks, limit=args.limit))
+    failed = [task for task, content in zip(tasks, contents) if content is None]
+    if failed:
+        logger.error(f"以下报告生成失败：{failed}")
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
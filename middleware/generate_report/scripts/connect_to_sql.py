@@ -1,5 +1,9 @@
 import pymysql
 import re
+import threading
+import time
+from functools import lru_cache
+from dbutils.pooled_db import PooledDB
 
 config = {
     'host': 'ip地址',
@@ -10,7 +14,7 @@ config = {
     'charset': 'utf8mb4'
 }
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 
 def get_root_connection():
@@ -23,6 +27,14 @@ def get_root_connection():
     )
 
 
+# 按天分库的库名：weibo_YYYY_MM_DD
+_WEIBO_DB_RE = re.compile(r"^weibo_(\d{4})_(\d{2})_(\d{2})$")
+# 最新库名的缓存有效期（秒），过期后才重新查询 information_schema
+LATEST_DB_TTL = 60
+_latest_db_checked_at = 0.0
+
+
+@lru_cache(maxsize=1)
 def latest_weibo_database() -> str:
     conn = get_root_connection()
     try:
@@ -33,7 +45,7 @@ def latest_weibo_database() -> str:
         conn.close()
     candidates = []
     for n in names:
-        m = re.match(r"^weibo_(\d{4})_(\d{2})_(\d{2})$", n)
+        m = _WEIBO_DB_RE.match(n)
         if m:
             y, mm, dd = map(int, m.groups())
             candidates.append(((y, mm, dd), n))
@@ -44,6 +56,11 @@ def latest_weibo_database() -> str:
 
 
 def ensure_current_db() -> str:
+    global _latest_db_checked_at
+    now = time.monotonic()
+    if now - _latest_db_checked_at > LATEST_DB_TTL:
+        latest_weibo_database.cache_clear()
+        _latest_db_checked_at = now
     try:
         db = latest_weibo_database()
         config["db"] = db
@@ -52,27 +69,53 @@ def ensure_current_db() -> str:
         return config["db"]
 
 
+# 每个库一个连接池，复用 TCP/认证握手；conn.close() 只是把连接还回池中
+_POOLS: Dict[str, PooledDB] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _pool_for(db_name: str) -> PooledDB:
+    pool = _POOLS.get(db_name)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(db_name)
+            if pool is None:
+                pool = PooledDB(
+                    creator=pymysql,
+                    mincached=2,
+                    maxcached=8,
+                    maxconnections=16,
+                    blocking=True,
+                    host=config["host"],
+                    port=config["port"],
+                    user=config["user"],
+                    password=config["password"],
+                    db=db_name,
+                    charset=config["charset"],
+                )
+                _POOLS[db_name] = pool
+    return pool
+
+
 def get_connection():
-    ensure_current_db()
-    return pymysql.connect(**config)
+    return _pool_for(ensure_current_db()).connection()
 
 
 def get_connection_for_db(db_name: str):
-    return pymysql.connect(
-        host=config["host"],
-        port=config["port"],
-        user=config["user"],
-        password=config["password"],
-        db=db_name,
-        charset=config["charset"],
-    )
+    return _pool_for(db_name).connection()
 
 #返回该数据库中的所有表名
 def list_tables() -> List[str]:
     """
     返回数据库中的所有表名
     """
-    conn = get_connection()
+    # 按库名缓存：ensure_current_db 切换到新库时键随之变化，自然失效
+    return list(_list_tables_cached(ensure_current_db()))
+
+
+@lru_cache(maxsize=32)
+def _list_tables_cached(db: str) -> Tuple[str, ...]:
+    conn = get_connection_for_db(db)
     try:
         cur = conn.cursor()
         # 查询系统库 information_schema.tables，获取当前数据库(schema)下的所有表名
@@ -85,34 +128,59 @@ def list_tables() -> List[str]:
             WHERE table_schema=%s
             ORDER BY table_name
             """,
-            (config["db"],),
+            (db,),
         )
-        return [row[0] for row in cur.fetchall()]
+        return tuple(row[0] for row in cur.fetchall())
     finally:
         conn.close()
 
 
+def clear_metadata_cache() -> None:
+    """清空表名/表结构缓存（例如运行中新建了表之后调用）。"""
+    _list_tables_cached.cache_clear()
+    _describe_cached.cache_clear()
 
-def fetch_hot_weibo(limit: int = 50, table: Optional[str] = None) -> List[Dict]:
-    try:
-        real_table = resolve_table(table) if table else latest_weibo_table()
-    except Exception:
-        real_table = latest_weibo_table()
+
+def _fetch_streaming(sql: str, params: tuple, limit: int) -> List[Dict]:
+    """用服务端游标逐行读取，客户端最多只持有 limit 行。"""
     conn = get_connection()
     try:
-        cur = conn.cursor(pymysql.cursors.DictCursor)
+        cur = conn.cursor(pymysql.cursors.SSDictCursor)
         try:
-            cur.execute(f"SELECT title, content, comment FROM `{real_table}` LIMIT %s", (limit,))
-        except Exception:
-            cur.execute(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,))
-        return cur.fetchall()
+            cur.execute(sql, params)
+            rows: List[Dict] = []
+            for row in cur:
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+            return rows
+        finally:
+            # 关闭前会读完剩余结果，释放服务端句柄，连接才能安全还回池中
+            cur.close()
     finally:
         conn.close()
 
 
+def fetch_hot_weibo(limit: int = 50, table: Optional[str] = None) -> List[Dict]:
+    try:
+        real_table = resolve_table(table) if table else latest_weibo_table()
+    except Exception:
+        real_table = latest_weibo_table()
+    cols = {c["name"] for c in describe_table(real_table)}
+    if {"title", "content", "comment"} <= cols:
+        return _fetch_streaming(f"SELECT title, content, comment FROM `{real_table}` LIMIT %s", (limit,), limit)
+    return _fetch_streaming(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,), limit)
+
+
 #根据表名返回该表的所有字段信息
 def describe_table(table: str) -> List[Dict]:
-    conn = get_connection()
+    # 一次运行中表结构不会变化，按 (库名, 表名) 缓存，返回副本避免调用方改动缓存
+    return [dict(c) for c in _describe_cached(ensure_current_db(), table)]
+
+
+@lru_cache(maxsize=256)
+def _describe_cached(db: str, table: str) -> Tuple[Dict, ...]:
+    conn = get_connection_for_db(db)
     try:
         cur = conn.cursor(pymysql.cursors.DictCursor)
         cur.execute(
@@ -128,9 +196,9 @@ def describe_table(table: str) -> List[Dict]:
             WHERE table_schema=%s AND table_name=%s
             ORDER BY ORDINAL_POSITION
             """,
-            (config["db"], table),
+            (db, table),
         )
-        return cur.fetchall()
+        return tuple(cur.fetchall())
     finally:
         conn.close()
 
@@ -140,7 +208,7 @@ def table_exists(table: str) -> bool:
     """
     justice whether the table exists in the database,if exist return True,else return False
     """
-    return table in list_tables()
+    return table in _list_tables_cached(ensure_current_db())
 
 
 def resolve_table(table: str) -> str:
@@ -148,7 +216,8 @@ def resolve_table(table: str) -> str:
     resolve the table name to the real table name in the database
     if the table name is not found, raise ValueError
     """
-    tables = list_tables()
+    # 直接使用缓存的元组，不必每次复制一份列表
+    tables = _list_tables_cached(ensure_current_db())
     if table in tables:
         return table
     candidates = [t for t in tables if t.startswith(table)]
@@ -162,7 +231,7 @@ def latest_weibo_table() -> str:
     return the latest weibo table name in the database
     if no weibo_* tables available, raise ValueError
     """
-    tables = list_tables()
+    tables = _list_tables_cached(ensure_current_db())
     candidates = [t for t in tables if t.startswith("weibo_")]
     if not candidates:
         raise ValueError("no weibo_* tables available")
@@ -171,84 +240,74 @@ def latest_weibo_table() -> str:
 
 def fetch_recent(table: str, limit: int = 50) -> List[Dict]:
     real_table = resolve_table(table)
-    conn = get_connection()
-    try:
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-        cols = [c["name"] for c in describe_table(real_table)]
-        #按照创建时间来排序，获取最新的limit条数据
-        if "created_at" in cols:
-            cur.execute(f"SELECT * FROM `{real_table}` ORDER BY `created_at` DESC LIMIT %s", (limit,))
-        else:
-            cur.execute(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,))
-        return cur.fetchall()
-    finally:
-        conn.close()
+    cols = [c["name"] for c in describe_table(real_table)]
+    #按照创建时间来排序，获取最新的limit条数据
+    if "created_at" in cols:
+        return _fetch_streaming(f"SELECT * FROM `{real_table}` ORDER BY `created_at` DESC LIMIT %s", (limit,), limit)
+    return _fetch_streaming(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,), limit)
 
 
 def fetch_top_by_metric(table: str, metric: str, limit: int = 20, desc: bool = True) -> List[Dict]:
     real_table = resolve_table(table)
-    conn = get_connection()
-    try:
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-        cols = [c["name"] for c in describe_table(real_table)]
-        if metric in cols:
-            order = "DESC" if desc else "ASC"
-            cur.execute(f"SELECT * FROM `{real_table}` ORDER BY `{metric}` {order} LIMIT %s", (limit,))
-        else:
-            cur.execute(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,))
-        return cur.fetchall()
-    finally:
-        conn.close()
+    cols = [c["name"] for c in describe_table(real_table)]
+    if metric in cols:
+        order = "DESC" if desc else "ASC"
+        return _fetch_streaming(f"SELECT * FROM `{real_table}` ORDER BY `{metric}` {order} LIMIT %s", (limit,), limit)
+    return _fetch_streaming(f"SELECT * FROM `{real_table}` LIMIT %s", (limit,), limit)
+
+
+# 关键词检索时参与匹配的常见文本列
+_TEXT_COLUMNS = ("title", "content", "comment", "text", "topics", "screen_name")
 
 
 def search_rows_keyword(table: str, keyword: str, limit: int = 20) -> List[Dict]:
     real_table = resolve_table(table)
-    data = fetch_recent(real_table, limit=200)
     kw = (keyword or "").strip()
     if not kw:
         return []
-    keys = ["title", "content", "comment", "text", "topics", "screen_name"]
-    results: List[Dict] = []
-    for item in data:
-        for k in keys:
-            v = str(item.get(k, ""))
-            if kw in v:
-                results.append(item)
-                break
-        if len(results) >= limit:
-            break
-    return results
-
-def ensure_reports_table(target_db: Optional[str] = None):
-    conn = get_connection_for_db(target_db) if target_db else get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS `reports` (
-              `id` INT AUTO_INCREMENT PRIMARY KEY,
-              `task` VARCHAR(255),
-              `content` LONGTEXT,
-              `file_path` VARCHAR(1024),
-              `created_at` DATETIME
-            ) CHARACTER SET utf8mb4
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    cols = {c["name"] for c in describe_table(real_table)}
+    text_cols = [k for k in _TEXT_COLUMNS if k in cols]
+    # 没有常见文本列就不可能命中
+    if not text_cols:
+        return []
+    # 过滤下推到数据库：只传回命中的行；转义 LIKE 通配符，关键词按字面匹配
+    pattern = "%" + kw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    where = " OR ".join(f"`{c}` LIKE %s" for c in text_cols)
+    order = " ORDER BY `created_at` DESC" if "created_at" in cols else ""
+    return _fetch_streaming(
+        f"SELECT * FROM `{real_table}` WHERE {where}{order} LIMIT %s",
+        (*[pattern] * len(text_cols), limit),
+        limit,
+    )
+
+_REPORTS_DDL = """
+    CREATE TABLE IF NOT EXISTS `reports` (
+      `id` INT AUTO_INCREMENT PRIMARY KEY,
+      `task` VARCHAR(255),
+      `content` LONGTEXT,
+      `file_path` VARCHAR(1024),
+      `created_at` DATETIME
+    ) CHARACTER SET utf8mb4
+    """
+
+# 本进程内已确认存在 reports 表的库，之后入库不再执行建表语句
+_REPORTS_READY: set = set()
 
 
 def save_report_to_db(task: str, content: str, file_path: str, target_db: Optional[str] = None) -> int:
-    ensure_reports_table(target_db)
-    conn = get_connection_for_db(target_db) if target_db else get_connection()
+    db = target_db or ensure_current_db()
+    # 建表与插入共用一个连接、一次提交
+    conn = get_connection_for_db(db)
     try:
         cur = conn.cursor()
+        if db not in _REPORTS_READY:
+            cur.execute(_REPORTS_DDL)
         cur.execute(
             "INSERT INTO `reports` (`task`, `content`, `file_path`, `created_at`) VALUES (%s, %s, %s, NOW())",
             (task, content, file_path),
         )
         conn.commit()
+        _REPORTS_READY.add(db)
         return cur.lastrowid
     finally:
         conn.close()
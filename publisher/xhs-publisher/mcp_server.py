@@ -1,6 +1,7 @@
 import asyncio
 import os
 import sys
+from collections import deque
 from typing import List
 from mcp.server.fastmcp import FastMCP
 
@@ -8,9 +9,59 @@ from mcp.server.fastmcp import FastMCP
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 # 对应的 CLI 脚本名称
 PUBLISH_SCRIPT_NAME = "run_publish_cli.py"
+# 发布子进程的超时时间（秒），可用环境变量 XHS_PUBLISH_TIMEOUT 覆盖
+PUBLISH_TIMEOUT = float(os.getenv("XHS_PUBLISH_TIMEOUT", "600"))
+# 只保留子进程最近的日志行，用于出错时回显
+LOG_TAIL_LINES = 200
 
 mcp = FastMCP("XHS Publisher")
 
+
+async def _forward_stderr(stream, tail):
+    # 子进程的 stderr 逐行转发到本进程 stderr，同时保留最后若干行
+    async for raw in stream:
+        line = raw.decode(errors="replace").rstrip()
+        print(f"[CLI Stderr]: {line}", file=sys.stderr)
+        tail.append(line)
+
+
+async def _run_publisher(cmd):
+    """逐行读取子进程输出并扫描标记，返回 (returncode, success, link, stdout_tail, stderr_tail)。"""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=PROJECT_ROOT,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout_tail = deque(maxlen=LOG_TAIL_LINES)
+    stderr_tail = deque(maxlen=LOG_TAIL_LINES)
+    stderr_task = asyncio.create_task(_forward_stderr(process.stderr, stderr_tail))
+    success = False
+    link = None
+    try:
+        async for raw in process.stdout:
+            line = raw.decode(errors="replace").rstrip()
+            print(f"[CLI Stdout]: {line}", file=sys.stderr)
+            # 两个标记都拿到后不再解析，只继续排空管道，避免子进程写满阻塞
+            if success and link is not None:
+                continue
+            if line.startswith("__PUBLISH_SUCCESS__"):
+                success = True
+            elif line.startswith("Link:"):
+                link = line[len("Link:"):].strip()
+            else:
+                stdout_tail.append(line)
+        await process.wait()
+        await stderr_task
+    except BaseException:
+        # 超时或客户端取消：结束子进程，不留孤儿浏览器
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        stderr_task.cancel()
+        raise
+    return process.returncode, success, link, stdout_tail, stderr_tail
+
 @mcp.tool()
 async def publish_xhs_note(json_path: str, image_paths: List[str]) -> str:
     """
@@ -27,34 +78,21 @@ async def publish_xhs_note(json_path: str, image_paths: List[str]) -> str:
             "--images", *image_paths
         ]
         
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=PROJECT_ROOT,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-        output = stdout.decode().strip()
-        error_output = stderr.decode().strip()
-
-        # 🔥 关键修改 2: 子进程的日志，也要转发到 stderr
-        if output: 
-            print(f"[CLI Stdout]:\n{output}", file=sys.stderr)
-        if error_output: 
-            print(f"[CLI Stderr]:\n{error_output}", file=sys.stderr)
+        try:
+            returncode, success, link, stdout_tail, stderr_tail = await asyncio.wait_for(
+                _run_publisher(cmd), timeout=PUBLISH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            return f"❌ Publisher process timed out after {PUBLISH_TIMEOUT:.0f}s."
+        output = "\n".join(stdout_tail)
+        error_output = "\n".join(stderr_tail)
 
-        if process.returncode != 0:
+        if returncode != 0:
             return f"❌ Publisher process failed.\nError output:\n{error_output}\n\nLog:\n{output}"
 
-        if "__PUBLISH_SUCCESS__" in output:
-            link = "Unknown"
-            for line in output.split('\n'):
-                if line.startswith("Link:"):
-                    link = line.replace("Link:", "").strip()
-            
+        if success:
             # 只有这里返回的内容，才是通过 MCP 协议传回给 Client 的
-            return f"✅ Publishing finished successfully!\n🔗 Link: {link}\n📂 Source: {os.path.basename(json_path)}"
+            return f"✅ Publishing finished successfully!\n🔗 Link: {link or 'Unknown'}\n📂 Source: {os.path.basename(json_path)}"
         else:
             return f"⚠️ Process finished but success marker not found.\nOutput:\n{output}"
 
@@ -85,8 +85,9 @@ async def publish_task(json_path, image_paths):
     print(f"🚀 准备发布: {title}")
     
     try:
-        # 6. 执行发布 (这一步会调用 Playwright)
-        result = await client.publish_note(note)
+        # 6. 执行发布 (这一步会调用 Playwright)；退出时关闭客户端持有的浏览器
+        async with client:
+            result = await client.publish_note(note)
         
         if result.success:
             print(f"✅ 发布成功！")
@@ -5,10 +5,20 @@
 """
 
 import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import tempfile
 import time
+from contextlib import asynccontextmanager
+from functools import cached_property
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -25,6 +35,201 @@ from .components.content_filler import XHSContentFiller
 
 logger = get_logger(__name__)
 
+# 候选选择器（按优先级排列，// 开头的为 XPath）
+UPLOAD_SELECTORS = (
+    ".upload-input",
+    "input[type='file']",
+    "[class*='upload'][type='file']",
+    ".file-input",
+    ".uploader-input",
+    "[accept*='image']",
+    "[accept*='video']",
+)
+PUBLISH_SELECTORS = (
+    ".publishBtn",
+    "[class*='publish']",
+    "button[type='submit']",
+    "//button[contains(text(), '发布')]",
+    "//button[contains(text(), '提交')]",
+)
+TITLE_INPUT_SELECTORS = (
+    ".d-text",
+    "[placeholder*='标题']",
+    "[placeholder*='title']",
+    "input[type='text']",
+    ".title-input",
+    ".input",
+)
+CONTENT_INPUT_SELECTORS = (
+    ".ql-editor",
+    "[placeholder*='内容']",
+    "[placeholder*='content']",
+    "textarea",
+    ".content-input",
+    ".editor",
+)
+
+# 在页面内按顺序尝试一组选择器（// 开头按 XPath，其余按 CSS），返回第一个满足条件的元素；
+# 一次 execute_script 代替逐个选择器的 find_elements 往返
+_FIND_FIRST_JS = """
+const [sels, visibleOnly, enabledOnly] = arguments;
+const ok = el => (!visibleOnly || el.getClientRects().length > 0) && (!enabledOnly || !el.disabled);
+for (const s of sels) {
+  let nodes;
+  if (s.startsWith('//')) {
+    const r = document.evaluate(s, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    nodes = Array.from({length: r.snapshotLength}, (_, i) => r.snapshotItem(i));
+  } else {
+    nodes = document.querySelectorAll(s);
+  }
+  for (const el of nodes) { if (ok(el)) return el; }
+}
+return null;
+"""
+
+# 监听页面变化，出现“上传成功”文字后置位 window.__xhsUploadDone；
+# 变化频繁（进度条）时合并为每 100ms 检查一次
+_UPLOAD_DONE_OBSERVER_JS = """
+window.__xhsUploadDone = document.body.innerText.includes('上传成功');
+if (!window.__xhsUploadDone) {
+  let pending = false;
+  const observer = new MutationObserver(() => {
+    if (pending) return;
+    pending = true;
+    setTimeout(() => {
+      pending = false;
+      if (document.body.innerText.includes('上传成功')) {
+        window.__xhsUploadDone = true;
+        observer.disconnect();
+      }
+    }, 100);
+  });
+  observer.observe(document.body, {subtree: true, childList: true, characterData: true});
+}
+"""
+
+# 查找文字包含指定标签、可见且位于可视区域内（坐标为正）的 .creator-tab
+_FIND_CREATOR_TAB_JS = """
+const label = arguments[0];
+for (const t of document.querySelectorAll('.creator-tab')) {
+  const r = t.getBoundingClientRect();
+  if (t.getClientRects().length > 0 && r.x > 0 && r.y > 0 && t.innerText.includes(label)) return t;
+}
+return null;
+"""
+
+# 收集可见的“视频大小/视频时长”文本（与原 XPath 一样只看 div 自身的文本节点）
+_VIDEO_INFO_JS = """
+return Array.from(document.querySelectorAll('div'))
+  .filter(d => d.getClientRects().length > 0 && Array.from(d.childNodes).some(
+    n => n.nodeType === Node.TEXT_NODE && (n.textContent.includes('视频大小') || n.textContent.includes('视频时长'))))
+  .map(d => d.innerText);
+"""
+
+# 发布模式切换是否完成（arguments: 被点击的选项卡, 目标类型 image/video, 另一类型）：
+# 页面默认是视频模式，旧的 input[type=file] 一开始就存在，不能只看上传控件是否出现；
+# 出现接受目标类型的上传控件即完成，否则要求选项卡已激活且旧模式的上传控件已移除
+_UPLOAD_MODE_READY_JS = """
+const tab = arguments[0], kind = arguments[1], other = arguments[2];
+if (document.querySelector(`input[type='file'][accept*='${kind}']`)) return true;
+return !!tab && tab.classList.contains('active')
+  && !document.querySelector(`input[type='file'][accept*='${other}']`)
+  && !!document.querySelector(".upload-input, input[type='file']");
+"""
+
+
+async def _call_collector(fn, *args):
+    """调用采集函数：协程函数直接 await，同步函数放到线程中执行"""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    result = await asyncio.to_thread(fn, *args)
+    # 被装饰器包装过的协程函数识别不出来，这里兜底
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def upload_mode_ready(tab, kind: str):
+    """等待条件：点击 tab 后切换到 kind（image/video）发布模式，且新模式的上传控件已渲染"""
+    other = "video" if kind == "image" else "image"
+    return lambda driver: driver.execute_script(_UPLOAD_MODE_READY_JS, tab, kind, other)
+
+# 等待条件：标题/正文编辑区已渲染（图片上传已被页面接收）
+EDITOR_READY = EC.presence_of_element_located((By.CSS_SELECTOR, ".d-text, [placeholder*='标题'], .ql-editor"))
+
+
+# requests 会话的连接池大小
+HTTP_POOL_SIZE = 16
+
+# 数据采集结果的磁盘缓存：当天的数据 10 分钟内有效，历史日期的数据 1 天内有效
+COLLECT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xhs_agent", "collect")
+COLLECT_TTL_TODAY = 600
+COLLECT_TTL_HISTORY = 86400
+
+
+def _collect_ttl(func, self, args: tuple, kwargs: Dict[str, Any]) -> int:
+    # 按被包装函数的真实签名取 date 参数，没有 date 参数的方法按当天数据处理
+    try:
+        bound = inspect.signature(func).bind(self, *args, **kwargs)
+    except TypeError:
+        return COLLECT_TTL_TODAY
+    date = bound.arguments.get("date")
+    if date and date != datetime.now().strftime("%Y-%m-%d"):
+        return COLLECT_TTL_HISTORY
+    return COLLECT_TTL_TODAY
+
+
+def disk_cached(func):
+    """
+    把采集结果按 (方法名, 参数) 缓存到磁盘
+    
+    命中时直接返回，不创建浏览器；只缓存成功的结果。
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        key = json.dumps([func.__name__, args, sorted(kwargs.items())], ensure_ascii=False, default=str)
+        path = os.path.join(COLLECT_CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+        try:
+            if time.time() - os.path.getmtime(path) <= _collect_ttl(func, self, args, kwargs):
+                with open(path, "r", encoding="utf-8") as f:
+                    logger.info(f"📦 命中采集缓存: {func.__name__}")
+                    return json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        result = await func(self, *args, **kwargs)
+        if isinstance(result, dict) and result.get("success", True) is not False:
+            try:
+                os.makedirs(COLLECT_CACHE_DIR, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=COLLECT_CACHE_DIR, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(result, f, ensure_ascii=False, default=str)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.debug(f"写入采集缓存失败: {e}")
+        return result
+    return wrapper
+
+
+def single_flight(func):
+    """
+    合并并发的重复调用
+    
+    同一客户端上参数相同的调用正在进行时，后来者直接等待同一个任务的结果，
+    不再另起一次采集。
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(self, *args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield：某个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+    return wrapper
+
 
 class XHSClient:
     """小红书客户端类"""
@@ -39,17 +244,89 @@ class XHSClient:
         self.config = config
         self.browser_manager = ChromeDriverManager(config)
         self.cookie_manager = CookieManager(config)
-        self.session = requests.Session()
         self.content_filler = None  # 延迟初始化，需要browser_manager运行时才能创建
-        self._setup_session()
+        # 数据采集共用一个已登录的浏览器，避免每次冷启动 Chrome 并重新加载 cookies
+        self._driver_lock = asyncio.Lock()
+        # cookies 缓存：(文件 mtime, cookies 列表)，文件未变化时不重复读取解析
+        self._cookies_cache = None
+        # 正在进行的采集任务，用于合并相同参数的并发调用
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+    
+    def _load_cookies(self) -> List[Dict[str, Any]]:
+        """读取cookies，cookies文件的修改时间未变时直接返回上次结果"""
+        # 以 CookieManager 实际读取的文件为准；拿不到路径时不走缓存
+        cookies_file = getattr(self.cookie_manager, "cookies_file", None)
+        try:
+            mtime = os.stat(cookies_file).st_mtime_ns if cookies_file else None
+        except OSError:
+            mtime = None
+        if mtime is not None and self._cookies_cache and self._cookies_cache[0] == mtime:
+            return self._cookies_cache[1]
+        cookies = self.cookie_manager.load_cookies()
+        if mtime is not None:
+            self._cookies_cache = (mtime, cookies)
+        return cookies
     
-    def _setup_session(self) -> None:
+    def _inject_cookies(self, cookies: List[Dict[str, Any]]) -> Any:
+        """
+        把cookies注入浏览器
+        
+        优先通过 CDP 的 Network.setCookies 一次性写入全部cookies，
+        驱动不支持 CDP 时回退到 browser_manager 逐条 add_cookie。
+        """
+        driver = self.browser_manager.driver
+        if cookies and hasattr(driver, "execute_cdp_cmd"):
+            cdp_cookies = []
+            for c in cookies:
+                # 缺少必要字段的cookie直接跳过，不影响其余cookie写入
+                if not (c.get("name") and "value" in c and c.get("domain")):
+                    continue
+                item = {
+                    "name": c["name"],
+                    "value": c["value"],
+                    "domain": c["domain"],
+                    "path": c.get("path", "/"),
+                }
+                if "expiry" in c:
+                    item["expires"] = c["expiry"]
+                for key in ("secure", "httpOnly", "sameSite"):
+                    if key in c:
+                        item[key] = c[key]
+                cdp_cookies.append(item)
+            try:
+                driver.execute_cdp_cmd("Network.setCookies", {"cookies": cdp_cookies})
+                return {"success": True, "loaded": len(cdp_cookies), "method": "cdp"}
+            except Exception as e:
+                logger.debug(f"CDP 批量设置cookies失败，回退逐条添加: {e}")
+        return self.browser_manager.load_cookies(cookies)
+    
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """创建带连接池与重试的 requests 会话，连接在多次请求间保持复用"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    @cached_property
+    def session(self) -> requests.Session:
+        """requests会话，首次访问时才创建并设置cookies（发布/采集只用浏览器，不需要它）"""
+        session = self._build_session()
+        self._setup_session(session)
+        return session
+    
+    def _setup_session(self, session: requests.Session) -> None:
         """设置requests会话"""
         try:
-            cookies = self.cookie_manager.load_cookies()
+            cookies = self._load_cookies()
             if cookies:
                 for cookie in cookies:
-                    self.session.cookies.set(
+                    session.cookies.set(
                         name=cookie['name'],
                         value=cookie['value'],
                         domain=cookie['domain']
@@ -74,31 +351,110 @@ class XHSClient:
         """
         logger.info(f"📝 开始发布小红书笔记: {note.title}")
         
-        try:
-            # 创建浏览器驱动
-            driver = self.browser_manager.create_driver()
+        # 与采集共用同一个驱动：发布期间独占，避免采集页面被导航走、结束时关掉采集中的会话
+        async with self._driver_lock:
+            try:
+                # 确保浏览器驱动存在（已有可用驱动时直接复用）
+                self._ensure_driver()
             
-            # 导航到创作者中心
-            self.browser_manager.navigate_to_creator_center()
+                # 导航到创作者中心
+                self.browser_manager.navigate_to_creator_center()
             
-            # 加载cookies
-            cookies = self.cookie_manager.load_cookies()
-            cookie_result = self.browser_manager.load_cookies(cookies)
+                # 加载cookies
+                cookies = self._load_cookies()
+                cookie_result = self._inject_cookies(cookies)
             
-            logger.info(f"🍪 Cookies加载结果: {cookie_result}")
+                logger.info(f"🍪 Cookies加载结果: {cookie_result}")
             
-            # 访问发布页面
-            return await self._publish_note_process(note)
+                # 访问发布页面
+                return await self._publish_note_process(note)
             
-        except Exception as e:
-            if isinstance(e, PublishError):
-                raise
-            else:
-                raise PublishError(f"发布笔记过程出错: {str(e)}", publish_step="初始化") from e
-        finally:
-            # 确保浏览器被关闭
-            self.browser_manager.close_driver()
+            except Exception as e:
+                if isinstance(e, PublishError):
+                    raise
+                else:
+                    raise PublishError(f"发布笔记过程出错: {str(e)}", publish_step="初始化") from e
+            finally:
+                # 确保浏览器被关闭
+                self.browser_manager.close_driver()
+    
+    def _ensure_driver(self):
+        """
+        返回可用的浏览器驱动，没有驱动或会话已失效时才新建
+        
+        Returns:
+            (driver, 是否新建)
+        """
+        driver = self.browser_manager.driver
+        if driver is not None and getattr(driver, "session_id", None):
+            # 浏览器可能已崩溃或被手动关闭，先探测一次再复用
+            try:
+                driver.title
+                return driver, False
+            except Exception as e:
+                logger.debug(f"浏览器驱动已失效，重新创建: {e}")
+                try:
+                    self.browser_manager.close_driver()
+                except Exception:
+                    pass
+        return self.browser_manager.create_driver(), True
+    
+    def _find_first(self, selectors, visible: bool = True, enabled: bool = False):
+        """
+        返回第一个匹配且满足可见/可用要求的元素
+        
+        Args:
+            selectors: 选择器列表，// 开头的按 XPath 处理
+            visible: 是否要求元素可见
+            enabled: 是否要求元素未禁用
+            
+        Returns:
+            WebElement，未找到返回None
+        """
+        return self.browser_manager.driver.execute_script(_FIND_FIRST_JS, list(selectors), visible, enabled)
+
+    def _set_input_files(self, upload_input, files: List[str]) -> None:
+        """
+        把文件列表设置到文件输入框
+        
+        优先用 CDP 的 DOM.setFileInputFiles 以数组一次性设置；
+        驱动不支持 CDP 或调用失败时回退到 send_keys（以换行拼接路径）。
+        """
+        driver = self.browser_manager.driver
+        if hasattr(driver, "execute_cdp_cmd"):
+            try:
+                # 先给目标元素打上临时标记，再用 CDP 定位到同一个节点
+                driver.execute_script("arguments[0].setAttribute('data-xhs-upload', '1')", upload_input)
+                root = driver.execute_cdp_cmd("DOM.getDocument", {"depth": 0})
+                node = driver.execute_cdp_cmd(
+                    "DOM.querySelector",
+                    {"nodeId": root["root"]["nodeId"], "selector": "[data-xhs-upload='1']"}
+                )
+                if node.get("nodeId"):
+                    driver.execute_cdp_cmd("DOM.setFileInputFiles", {"files": list(files), "nodeId": node["nodeId"]})
+                    driver.execute_script("arguments[0].removeAttribute('data-xhs-upload')", upload_input)
+                    return
+            except Exception as e:
+                logger.debug(f"CDP 设置上传文件失败，回退 send_keys: {e}")
+        upload_input.send_keys('\n'.join(files))
     
+    async def _wait_dom(self, condition, timeout: float = 15) -> bool:
+        """
+        等待页面满足条件（事件驱动，代替固定 sleep）
+        
+        WebDriverWait 是阻塞轮询，放到线程池执行以免卡住事件循环。
+        
+        Returns:
+            条件满足返回True，超时返回False
+        """
+        wait = WebDriverWait(self.browser_manager.driver, timeout, poll_frequency=0.2)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, wait.until, condition)
+            return True
+        except TimeoutException:
+            return False
+
     async def _publish_note_process(self, note: XHSNote) -> XHSPublishResult:
         """执行发布笔记的具体流程"""
         driver = self.browser_manager.driver
@@ -106,14 +462,20 @@ class XHSClient:
         try:
             logger.info("🌐 直接访问小红书发布页面...")
             driver.get("https://creator.xiaohongshu.com/publish/publish?from=menu")
-            await asyncio.sleep(5)  # 等待页面基本加载
+            # 页面已重新加载，之前缓存的输入框元素全部失效
+            if self.content_filler:
+                self.content_filler.invalidate_cache()
+            
+            logger.info("⏳ 等待页面元素完全渲染...")
+            # 发布页的选项卡渲染出来即可继续，不再固定等待
+            await self._wait_dom(
+                lambda d: "publish" in d.current_url and d.find_elements(By.CSS_SELECTOR, ".creator-tab"),
+                timeout=15
+            )
             
             if "publish" not in driver.current_url:
                 raise PublishError("无法访问发布页面，可能需要重新登录", publish_step="页面访问")
             
-            logger.info("⏳ 等待页面元素完全渲染...")
-            await asyncio.sleep(3)  # 等待页面元素完全渲染
-            
             # 根据内容类型切换发布模式
             await self._switch_publish_mode(note)
             
@@ -146,22 +508,13 @@ class XHSClient:
                 logger.info("🔄 切换到图文发布模式...")
                 # 查找"上传图文"选项卡
                 try:
-                    # 查找所有creator-tab元素
-                    tabs = driver.find_elements(By.CSS_SELECTOR, ".creator-tab")
-                    image_tab = None
-                    
-                    for tab in tabs:
-                        if tab.is_displayed() and "上传图文" in tab.text:
-                            # 确保元素在可见区域内（不是负坐标）
-                            rect = tab.rect
-                            if rect['x'] > 0 and rect['y'] > 0:
-                                image_tab = tab
-                                break
+                    image_tab = driver.execute_script(_FIND_CREATOR_TAB_JS, "上传图文")
                     
                     if image_tab:
                         image_tab.click()
                         logger.info("✅ 已切换到图文发布模式")
-                        await asyncio.sleep(2)  # 等待界面切换完成
+                        # 等待选项卡激活、图片上传控件出现，代表界面切换完成
+                        await self._wait_dom(upload_mode_ready(image_tab, "image"), timeout=10)
                     else:
                         logger.warning("⚠️ 未找到图文发布选项卡，可能已经在图文模式")
                         
@@ -172,20 +525,12 @@ class XHSClient:
                 logger.info("🔄 切换到视频发布模式...")
                 # 页面默认就是视频模式，检查是否需要切换
                 try:
-                    tabs = driver.find_elements(By.CSS_SELECTOR, ".creator-tab")
-                    video_tab = None
-                    
-                    for tab in tabs:
-                        if tab.is_displayed() and "上传视频" in tab.text:
-                            rect = tab.rect
-                            if rect['x'] > 0 and rect['y'] > 0:
-                                video_tab = tab
-                                break
+                    video_tab = driver.execute_script(_FIND_CREATOR_TAB_JS, "上传视频")
                     
-                    if video_tab and "active" not in video_tab.get_attribute("class"):
+                    if video_tab and "active" not in (video_tab.get_attribute("class") or ""):
                         video_tab.click()
                         logger.info("✅ 已切换到视频发布模式")
-                        await asyncio.sleep(2)
+                        await self._wait_dom(upload_mode_ready(video_tab, "video"), timeout=10)
                     else:
                         logger.info("✅ 已在视频发布模式")
                         
@@ -198,9 +543,6 @@ class XHSClient:
     async def _handle_file_upload(self, note: XHSNote) -> None:
         """统一处理文件上传（图片/视频）"""
         try:
-            driver = self.browser_manager.driver
-            wait = WebDriverWait(driver, 30)
-            
             # 合并图片和视频文件
             files_to_upload = []
             has_video = False
@@ -216,53 +558,34 @@ class XHSClient:
             if files_to_upload:
                 # 尝试多个可能的选择器查找上传元素
                 upload_input = None
-                upload_selectors = [
-                    ".upload-input",
-                    "input[type='file']",
-                    "[class*='upload'][type='file']",
-                    ".file-input",
-                    ".uploader-input",
-                    "[accept*='image']",
-                    "[accept*='video']"
-                ]
-                
                 logger.info("🔍 查找上传元素...")
-                for selector in upload_selectors:
-                    try:
-                        elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                        for element in elements:
-                            if element.is_displayed():
-                                upload_input = element
-                                logger.info(f"✅ 找到可见的上传元素: {selector}")
-                                break
-                        if upload_input:
-                            break
-                    except Exception:
-                        continue
+                upload_input = self._find_first(UPLOAD_SELECTORS)
+                if upload_input:
+                    logger.info("✅ 找到可见的上传元素")
                 
-                # 如果还是没找到，用xpath方式
+                # 如果还是没找到，用xpath方式（文件输入框常被隐藏，不要求可见）
                 if not upload_input:
-                    try:
-                        upload_input = driver.find_element(By.XPATH, "//input[@type='file']")
+                    upload_input = self._find_first(["//input[@type='file']"], visible=False)
+                    if upload_input:
                         logger.info("✅ 通过XPath找到上传元素")
-                    except Exception:
+                    else:
                         logger.error("❌ 无法找到任何文件上传元素")
                         # 继续执行，可能页面结构已改变
                         return
                 
                 # 发送文件路径
-                upload_input.send_keys('\n'.join(files_to_upload))
+                self._set_input_files(upload_input, files_to_upload)
                 logger.info("✅ 文件上传指令已发送")
                 
-                # 给时间让上传开始
-                await asyncio.sleep(3)
+                # 短暂缓冲，让上传开始
+                await asyncio.sleep(0.2)
                 
                 # 如果有视频，等待上传完成
                 if has_video:
                     await self._wait_for_video_upload_complete()
                 else:
-                    # 图片上传给少量时间
-                    await asyncio.sleep(2)
+                    # 图片上传后编辑区才会出现，出现即可继续
+                    await self._wait_dom(EDITOR_READY, timeout=15)
                     
         except Exception as e:
             logger.warning(f"⚠️ 处理文件上传时出错: {e}")
@@ -275,50 +598,26 @@ class XHSClient:
             
             logger.info("⏳ 等待视频上传完成...")
             
-            # 等待上传成功标识出现 - 使用轮询方式
-            success_selectors = [
-                "//div[contains(text(), '上传成功')]",
-                "//span[contains(text(), '上传成功')]", 
-                "//*[contains(text(), '上传成功')]",
-                "//div[contains(@class, 'success')]"
-            ]
+            # 页面内安装 MutationObserver，"上传成功" 出现时置位标记；
+            # Python 侧只需轮询一个布尔值，不再每轮跑多条 XPath
+            driver.execute_script(_UPLOAD_DONE_OBSERVER_JS)
             
             max_wait_time = 120  # 最大等待2分钟，避免MCP超时
-            check_interval = 2   # 每2秒检查一次
-            elapsed_time = 0
-            success_found = False
-            
-            while elapsed_time < max_wait_time and not success_found:
-                # 检查所有可能的成功标识
-                for selector in success_selectors:
-                    try:
-                        elements = driver.find_elements(By.XPATH, selector)
-                        for element in elements:
-                            if element.is_displayed() and "上传成功" in element.text:
-                                logger.info("✅ 视频上传完成！")
-                                success_found = True
-                                break
-                        if success_found:
-                            break
-                    except Exception:
-                        continue
-                
-                if not success_found:
-                    logger.debug(f"⏳ 继续等待上传完成... ({elapsed_time}s/{max_wait_time}s)")
-                    await asyncio.sleep(check_interval)
-                    elapsed_time += check_interval
+            success_found = await self._wait_dom(
+                lambda d: d.execute_script("return window.__xhsUploadDone === true"),
+                timeout=max_wait_time
+            )
             
-            if not success_found:
+            if success_found:
+                logger.info("✅ 视频上传完成！")
+            else:
                 logger.warning(f"⚠️ 等待{max_wait_time}秒后未检测到上传成功标识，继续流程")
             
-            # 尝试获取视频信息
+            # 尝试获取视频信息（一次脚本调用取回所有可见的信息文本）
             try:
-                video_info_elements = driver.find_elements(
-                    By.XPATH, "//div[contains(text(), '视频大小') or contains(text(), '视频时长')]"
-                )
-                for info in video_info_elements:
-                    if info.is_displayed():
-                        logger.info(f"📹 {info.text}")
+                infos = driver.execute_script(_VIDEO_INFO_JS) or []
+                for info in infos:
+                    logger.info(f"📹 {info}")
             except:
                 pass  # 视频信息获取失败不影响主流程
                 
@@ -333,8 +632,6 @@ class XHSClient:
         if not self.content_filler:
             self.content_filler = XHSContentFiller(self.browser_manager)
         
-        await asyncio.sleep(2)  # 等待上传动作缓冲
-        
         # 2. 调用 ContentFiller 填写标题
         # (这会使用您在 ContentFiller 里定义的逻辑)
         if not await self.content_filler.fill_title(note.title):
@@ -350,8 +647,6 @@ class XHSClient:
             await self.content_filler.fill_topics(note.topics)
         else:
             logger.info("📋 没有话题需要填写")
-        
-        await asyncio.sleep(2)
     
     async def _submit_note(self, note: XHSNote) -> XHSPublishResult:
         """提交发布笔记"""
@@ -360,35 +655,17 @@ class XHSClient:
         try:
             logger.info("🚀 点击发布按钮...")
             
-            # 尝试多个发布按钮选择器
-            publish_selectors = [
-                ".publishBtn",
-                "[class*='publish']",
-                "button[type='submit']",
-                "//button[contains(text(), '发布')]",
-                "//button[contains(text(), '提交')]"
-            ]
-            
-            submit_btn = None
-            for selector in publish_selectors:
-                try:
-                    if selector.startswith("//"):
-                        submit_btn = driver.find_element(By.XPATH, selector)
-                    else:
-                        submit_btn = driver.find_element(By.CSS_SELECTOR, selector)
-                    
-                    if submit_btn.is_displayed() and submit_btn.is_enabled():
-                        logger.info(f"✅ 找到发布按钮: {selector}")
-                        break
-                except:
-                    continue
+            submit_btn = self._find_first(PUBLISH_SELECTORS, enabled=True)
             
             if not submit_btn:
                 raise PublishError("无法找到发布按钮", publish_step="查找发布按钮")
+            logger.info("✅ 找到发布按钮")
             
+            before_url = driver.current_url
             submit_btn.click()
             logger.info("✅ 发布按钮已点击")
-            await asyncio.sleep(3)
+            # 发布成功后页面会跳转，URL 变化即可读取结果
+            await self._wait_dom(lambda d: d.current_url != before_url, timeout=10)
             
             current_url = driver.current_url
             logger.info(f"📍 发布后页面URL: {current_url}")
@@ -499,59 +776,27 @@ class XHSClient:
     
     async def _fill_note_content_existing(self) -> None:
         """填写已上传文件的笔记内容（从用户输入获取）"""
-        driver = self.browser_manager.driver
-        wait = WebDriverWait(driver, 15)
-        
         await asyncio.sleep(2)  # 等待页面稳定
         
         # 由于这是分阶段操作，内容需要从页面现有的输入框获取或提示用户
         # 这里先做基础检查，确保页面状态正常
         try:
-            # 检查标题输入框是否存在
-            title_selectors = [
-                ".d-text",
-                "[placeholder*='标题']",
-                "[placeholder*='title']",
-                "input[type='text']",
-                ".title-input",
-                ".input"
-            ]
-            
+            # 所有候选一次查询，等待其中任一出现
             title_input = None
-            for selector in title_selectors:
-                try:
-                    title_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                    if title_input.is_displayed():
-                        logger.info(f"✅ 确认标题输入框可用: {selector}")
-                        break
-                except:
-                    continue
+            if await self._wait_dom(lambda d: self._find_first(TITLE_INPUT_SELECTORS), timeout=15):
+                title_input = self._find_first(TITLE_INPUT_SELECTORS)
             
             if not title_input:
                 raise PublishError("无法找到标题输入框", publish_step="检查标题输入框")
-            
-            # 检查内容输入框是否存在
-            content_selectors = [
-                ".ql-editor",
-                "[placeholder*='内容']",
-                "[placeholder*='content']",
-                "textarea",
-                ".content-input",
-                ".editor"
-            ]
+            logger.info("✅ 确认标题输入框可用")
             
             content_input = None
-            for selector in content_selectors:
-                try:
-                    content_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                    if content_input.is_displayed():
-                        logger.info(f"✅ 确认内容输入框可用: {selector}")
-                        break
-                except:
-                    continue
+            if await self._wait_dom(lambda d: self._find_first(CONTENT_INPUT_SELECTORS), timeout=15):
+                content_input = self._find_first(CONTENT_INPUT_SELECTORS)
             
             if not content_input:
                 raise PublishError("无法找到内容输入框", publish_step="检查内容输入框")
+            logger.info("✅ 确认内容输入框可用")
             
             logger.info("✅ 页面状态正常，标题和内容输入框都可用")
             
@@ -565,36 +810,18 @@ class XHSClient:
         try:
             logger.info("🚀 检查发布按钮状态...")
             
-            # 尝试多个发布按钮选择器
-            publish_selectors = [
-                ".publishBtn",
-                "[class*='publish']",
-                "button[type='submit']",
-                "//button[contains(text(), '发布')]",
-                "//button[contains(text(), '提交')]"
-            ]
-            
-            submit_btn = None
-            for selector in publish_selectors:
-                try:
-                    if selector.startswith("//"):
-                        submit_btn = driver.find_element(By.XPATH, selector)
-                    else:
-                        submit_btn = driver.find_element(By.CSS_SELECTOR, selector)
-                    
-                    if submit_btn.is_displayed() and submit_btn.is_enabled():
-                        logger.info(f"✅ 确认发布按钮可用: {selector}")
-                        break
-                except:
-                    continue
+            submit_btn = self._find_first(PUBLISH_SELECTORS, enabled=True)
             
             if not submit_btn:
                 raise PublishError("无法找到可用的发布按钮", publish_step="检查发布按钮")
+            logger.info("✅ 确认发布按钮可用")
             
             # 点击发布
+            before_url = driver.current_url
             submit_btn.click()
             logger.info("✅ 发布按钮已点击")
-            await asyncio.sleep(3)
+            # 发布成功后页面会跳转，URL 变化即可读取结果
+            await self._wait_dom(lambda d: d.current_url != before_url, timeout=10)
             
             current_url = driver.current_url
             logger.info(f"📍 发布后页面URL: {current_url}")
@@ -612,7 +839,40 @@ class XHSClient:
 
     # ==================== 数据采集功能 ====================
     
+    @asynccontextmanager
+    async def _acquire_driver(self):
+        """
+        独占使用共享的浏览器驱动
+        
+        首次使用时创建驱动并加载cookies，用完不关闭，留给后续采集复用；
+        驱动被关闭（例如发布流程结束）后下次使用时自动重建。
+        """
+        async with self._driver_lock:
+            _, created = self._ensure_driver()
+            if created:
+                cookies = self._load_cookies()
+                cookie_result = self._inject_cookies(cookies)
+                logger.info(f"🍪 Cookies加载结果: {cookie_result}")
+            yield self.browser_manager.driver
+    
+    async def aclose(self) -> None:
+        """关闭共享的浏览器驱动和HTTP会话"""
+        async with self._driver_lock:
+            if self.browser_manager.driver is not None:
+                self.browser_manager.close_driver()
+        # 会话从未被访问过就无需创建后再关闭
+        if "session" in self.__dict__:
+            self.session.close()
+    
+    async def __aenter__(self) -> "XHSClient":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+    
     @handle_exception
+    @disk_cached
+    @single_flight
     async def collect_creator_data(self, date: Optional[str] = None) -> Dict[str, Any]:
         """
         采集创作者数据中心的全部核心数据
@@ -627,62 +887,56 @@ class XHSClient:
         
         logger.info("📊 开始采集创作者数据中心数据...")
         
+        # 采集结果
+        result = {
+            "success": True,
+            "collect_time": datetime.now().isoformat(),
+            "date": date or datetime.now().strftime("%Y-%m-%d"),
+            "data": {}
+        }
+        
         try:
-            # 创建浏览器驱动
-            driver = self.browser_manager.create_driver()
-            
-            # 加载cookies
-            cookies = self.cookie_manager.load_cookies()
-            cookie_result = self.browser_manager.load_cookies(cookies)
-            logger.info(f"🍪 Cookies加载结果: {cookie_result}")
-            
-            # 采集结果
-            result = {
-                "success": True,
-                "collect_time": datetime.now().isoformat(),
-                "date": date or datetime.now().strftime("%Y-%m-%d"),
-                "data": {}
-            }
-            
-            try:
-                # 采集账号概览数据
-                logger.info("🏠 开始采集账号概览数据...")
-                dashboard_data = collect_dashboard_data(driver, date)
-                result["data"]["dashboard"] = dashboard_data
-                
-                # 等待间隔，遵守采集规范
-                await asyncio.sleep(3)
-                
-                # 采集内容分析数据
-                logger.info("📊 开始采集内容分析数据...")
-                content_data = collect_content_analysis_data(driver, date)
-                result["data"]["content_analysis"] = content_data
-                
-                # 等待间隔
-                await asyncio.sleep(3)
-                
-                # 采集粉丝数据
-                logger.info("👥 开始采集粉丝数据...")
-                fans_data = collect_fans_data(driver, date)
-                result["data"]["fans"] = fans_data
-                
-                logger.info("✅ 创作者数据采集完成")
-                
-            except Exception as e:
-                logger.error(f"❌ 数据采集过程出错: {e}")
-                result["success"] = False
-                result["error"] = str(e)
-                
+            async with self._acquire_driver() as driver:
+                # 三个页面共用同一个 WebDriver 会话，命令只能串行执行；
+                # 同步采集函数放到线程中运行，避免阻塞事件循环（协程函数直接 await）
+                try:
+                    # 采集账号概览数据
+                    logger.info("🏠 开始采集账号概览数据...")
+                    dashboard_data = await _call_collector(collect_dashboard_data, driver, date)
+                    result["data"]["dashboard"] = dashboard_data
+                    
+                    # 等待间隔，遵守采集规范
+                    await asyncio.sleep(3)
+                    
+                    # 采集内容分析数据
+                    logger.info("📊 开始采集内容分析数据...")
+                    content_data = await _call_collector(collect_content_analysis_data, driver, date)
+                    result["data"]["content_analysis"] = content_data
+                    
+                    # 等待间隔
+                    await asyncio.sleep(3)
+                    
+                    # 采集粉丝数据
+                    logger.info("👥 开始采集粉丝数据...")
+                    fans_data = await _call_collector(collect_fans_data, driver, date)
+                    result["data"]["fans"] = fans_data
+                    
+                    logger.info("✅ 创作者数据采集完成")
+                    
+                except Exception as e:
+                    logger.error(f"❌ 数据采集过程出错: {e}")
+                    result["success"] = False
+                    result["error"] = str(e)
+                    
         except Exception as e:
             logger.error(f"❌ 初始化数据采集环境失败: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            # 确保浏览器被关闭
-            self.browser_manager.close_driver()
         
         return result
     
     @handle_exception
+    @disk_cached
+    @single_flight
     async def collect_dashboard_data(self, date: Optional[str] = None, save_data: bool = True) -> Dict[str, Any]:
         """
         采集账号概览数据
@@ -699,21 +953,18 @@ class XHSClient:
         logger.info("🏠 开始采集账号概览数据...")
         
         try:
-            driver = self.browser_manager.create_driver()
-            cookies = self.cookie_manager.load_cookies()
-            self.browser_manager.load_cookies(cookies)
-            
-            result = await collect_dashboard_data(driver, date, save_data)
+            async with self._acquire_driver() as driver:
+                result = await collect_dashboard_data(driver, date, save_data)
             
         except Exception as e:
             logger.error(f"❌ 采集账号概览数据失败: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            self.browser_manager.close_driver()
         
         return result
     
     @handle_exception
+    @disk_cached
+    @single_flight
     async def collect_content_analysis_data(self, date: Optional[str] = None, 
                                                limit: int = 50, save_data: bool = True) -> Dict[str, Any]:
         """
@@ -732,21 +983,18 @@ class XHSClient:
         logger.info("📊 开始采集内容分析数据...")
         
         try:
-            driver = self.browser_manager.create_driver()
-            cookies = self.cookie_manager.load_cookies()
-            self.browser_manager.load_cookies(cookies)
-            
-            result = await collect_content_analysis_data(driver, date, limit, save_data)
+            async with self._acquire_driver() as driver:
+                result = await collect_content_analysis_data(driver, date, limit, save_data)
             
         except Exception as e:
             logger.error(f"❌ 采集内容分析数据失败: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            self.browser_manager.close_driver()
         
         return result
     
     @handle_exception
+    @disk_cached
+    @single_flight
     async def collect_fans_data(self, date: Optional[str] = None, save_data: bool = True) -> Dict[str, Any]:
         """
         采集粉丝数据
@@ -763,21 +1011,18 @@ class XHSClient:
         logger.info("👥 开始采集粉丝数据...")
         
         try:
-            driver = self.browser_manager.create_driver()
-            cookies = self.cookie_manager.load_cookies()
-            self.browser_manager.load_cookies(cookies)
-            
-            result = await collect_fans_data(driver, date, save_data)
+            async with self._acquire_driver() as driver:
+                result = await collect_fans_data(driver, date, save_data)
             
         except Exception as e:
             logger.error(f"❌ 采集粉丝数据失败: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            self.browser_manager.close_driver()
         
         return result
     
     @handle_exception
+    @disk_cached
+    @single_flight
     async def collect_note_detail_data(self, note_title: str) -> Dict[str, Any]:
         """
         采集单篇笔记的详细数据
@@ -793,21 +1038,16 @@ class XHSClient:
         logger.info(f"📋 开始采集笔记详细数据: {note_title}")
         
         try:
-            driver = self.browser_manager.create_driver()
-            cookies = self.cookie_manager.load_cookies()
-            self.browser_manager.load_cookies(cookies)
-            
-            # 先访问内容分析页面
-            driver.get("https://creator.xiaohongshu.com/statistics/data-analysis")
-            await asyncio.sleep(3)
-            
-            result = collect_note_detail_data(driver, note_title)
+            async with self._acquire_driver() as driver:
+                # 先访问内容分析页面
+                driver.get("https://creator.xiaohongshu.com/statistics/data-analysis")
+                await asyncio.sleep(3)
+                
+                result = collect_note_detail_data(driver, note_title)
             
         except Exception as e:
             logger.error(f"❌ 采集笔记详细数据失败: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            self.browser_manager.close_driver()
         
         return result
 